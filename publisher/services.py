@@ -1,10 +1,11 @@
 # /Users/junluo/Documents/wechat_publisher_web/publisher/services.py
 import os
+import shutil
 import uuid
 import json
 import logging
 from pathlib import Path
-from typing import Dict, Callable, Any, List, Optional, Tuple # Added Tuple
+from typing import Dict, Callable, Any, Iterable, List, Optional, Tuple # Added Tuple
 
 from django.conf import settings
 from django.utils import timezone
@@ -23,7 +24,7 @@ try:
     from publishing_engine.core import metadata_reader, html_processor, payload_builder
     from publishing_engine.wechat import auth
     from publishing_engine.wechat import api as wechat_api
-    from publishing_engine.utils.hashing_checking import calculate_file_hash
+    from publishing_engine.utils.hashing_checking import calculate_file_hash, FINGERPRINT_ALGORITHM
     # --- Import Image Processing Utility ---
     from publishing_engine.utils.image_processing import (
         ensure_image_size,
@@ -49,15 +50,12 @@ except ModuleNotFoundError as e:
 
 # --- Helper Functions ---
 
-# _save_uploaded_file_locally (Unchanged)
+# _save_uploaded_file_locally
 def _save_uploaded_file_locally(file_obj: UploadedFile, subfolder: str = "") -> Path:
     """
     Saves an uploaded file locally with a unique name and returns its absolute Path object.
     """
     try:
-        file_obj.seek(0)
-        file_content = file_obj.read()
-        file_obj.seek(0)
         file_ext = Path(file_obj.name).suffix.lower()
         original_filename_stem = Path(file_obj.name).stem
         safe_stem = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in original_filename_stem)[:50]
@@ -65,8 +63,15 @@ def _save_uploaded_file_locally(file_obj: UploadedFile, subfolder: str = "") ->
         local_save_dir = Path(settings.MEDIA_ROOT) / subfolder
         local_save_dir.mkdir(parents=True, exist_ok=True)
         local_save_path_abs = local_save_dir / unique_filename
-        with open(local_save_path_abs, 'wb') as destination:
-            destination.write(file_content)
+        if hasattr(file_obj, 'temporary_file_path'):
+            # Large uploads are already on disk (TemporaryUploadedFile); copy in-kernel (sendfile on Linux)
+            shutil.copyfile(file_obj.temporary_file_path(), local_save_path_abs)
+        else:
+            file_obj.seek(0)
+            with open(local_save_path_abs, 'wb') as destination:
+                for chunk in file_obj.chunks():
+                    destination.write(chunk)
+        file_obj.seek(0)
         logger.info(f"File '{file_obj.name}' saved locally to absolute path: {local_save_path_abs}")
         return local_save_path_abs
     except IOError as e:
@@ -78,9 +83,10 @@ def _save_uploaded_file_locally(file_obj: UploadedFile, subfolder: str = "") ->
 
 
 # _generate_preview_file (Unchanged)
-def _generate_preview_file(full_html_content: str, task_id: uuid.UUID) -> str:
+def _generate_preview_file(full_html_content: str | Iterable[str], task_id: uuid.UUID) -> str:
     """
     Saves the FULL HTML content to a preview file locally and returns its relative path as a string.
+    The content may be given as pieces, which are written in order without joining them first.
     """
     try:
         preview_filename = f"{task_id}.html"
@@ -89,8 +95,10 @@ def _generate_preview_file(full_html_content: str, task_id: uuid.UUID) -> str:
         preview_file_abs = Path(settings.MEDIA_ROOT) / preview_path_rel
         preview_file_abs.parent.mkdir(parents=True, exist_ok=True)
         logger.info(f"Attempting to save FULL HTML preview file locally to: {preview_file_abs}")
+        if isinstance(full_html_content, str):
+            full_html_content = (full_html_content,)
         with open(preview_file_abs, 'w', encoding='utf-8') as f:
-            f.write(full_html_content)
+            f.writelines(full_html_content)
         relative_path_str = preview_path_rel.as_posix()
         logger.info(f"Preview file saved successfully to relative path: {relative_path_str}")
         return relative_path_str
@@ -188,9 +196,9 @@ def start_processing_job(
 
         # --- Caching Logic Start (Using hash of the *processed* file) ---
         permanent_thumb_media_id: Optional[str] = None
-        cover_image_hash = calculate_file_hash(processed_cover_path_abs, algorithm='sha256')
+        cover_image_hash = calculate_file_hash(processed_cover_path_abs, algorithm=FINGERPRINT_ALGORITHM)
         if cover_image_hash:
-            cache_key = f"wechat_thumb_sha256_{cover_image_hash}"
+            cache_key = f"wechat_thumb_{FINGERPRINT_ALGORITHM}_{cover_image_hash}"
             logger.debug(f"[Job {task_id}] Checking cache for thumbnail key: {cache_key} (from processed file)")
             cached_media_id = cache.get(cache_key)
             if cached_media_id:
@@ -294,20 +302,20 @@ def start_processing_job(
             except Exception as process_err:
                 err = f"Error resolving/processing image path '{image_local_path}': {process_err}"; logger.error(f"[Job {task_id}] {err}", exc_info=True); image_processing_warnings.append(f"Image error: {image_local_path.name}"); return None, err
 
-            # Ensure processed_content_path is valid before hashing/uploading
-            if not processed_content_path or not processed_content_path.is_file():
+            # ensure_image_size has already checked the file, so only guard against a missing path
+            if not processed_content_path:
                 err = f"Processed content image path is invalid or file not found: {processed_content_path}"
                 logger.error(f"[Job {task_id}] {err}")
                 image_processing_warnings.append(f"Image processing error: {image_local_path.name}")
                 return None, err
 
-            content_image_hash = calculate_file_hash(processed_content_path, algorithm='sha256')
+            content_image_hash = calculate_file_hash(processed_content_path, algorithm=FINGERPRINT_ALGORITHM)
             wechat_url: Optional[str] = None; cached_result: Optional[Tuple[Optional[str], Optional[str]]] = None
             content_cache_key: Optional[str] = None # Define here for broader scope
 
             if not content_image_hash: logger.warning(f"[Job {task_id}] Could not calculate hash for processed content image {processed_content_path.name}, skipping cache.")
             else:
-                content_cache_key = f"wechat_content_url_sha256_{content_image_hash}"; cached_result = cache.get(content_cache_key) or callback_upload_cache.get(content_cache_key)
+                content_cache_key = f"wechat_content_url_{FINGERPRINT_ALGORITHM}_{content_image_hash}"; cached_result = cache.get(content_cache_key) or callback_upload_cache.get(content_cache_key)
                 if cached_result:
                     cached_url, cached_err = cached_result
                     if cached_url: logger.debug(f"[Job {task_id}] Cache HIT for content image {processed_content_path.name}. Using URL: {cached_url}"); return cached_url, None
@@ -321,11 +329,11 @@ def start_processing_job(
                     return wechat_url, None
                 else:
                     err = f"WeChat API returned no URL for uploaded image: {processed_content_path.name}"; logger.error(f"[Job {task_id}] {err}"); result_to_cache = (None, err)
-                    if content_image_hash and content_cache_key: cache_timeout = settings.WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT; cache.set(content_cache_key, result_to_cache, timeout=cache_timeout); callback_upload_cache[content_cache_key] = result_to_cache; logger.debug(f"[Job {task_id}] Stored failure result in cache (Key: {content_cache_key}).")
+                    if content_image_hash and content_cache_key: cache_timeout = settings.WECHAT_UPLOAD_FAILURE_CACHE_TIMEOUT; cache.set(content_cache_key, result_to_cache, timeout=cache_timeout); callback_upload_cache[content_cache_key] = result_to_cache; logger.debug(f"[Job {task_id}] Stored failure result in cache (Key: {content_cache_key}).")
                     image_processing_warnings.append(f"Image upload failed (no URL): {processed_content_path.name}"); return None, err
             except Exception as e:
                 err = f"Upload error for {processed_content_path.name}: {e}"; logger.exception(f"[Job {task_id}] {err}"); result_to_cache = (None, err)
-                if content_image_hash and content_cache_key: cache_timeout = settings.WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT; cache.set(content_cache_key, result_to_cache, timeout=cache_timeout); callback_upload_cache[content_cache_key] = result_to_cache; logger.debug(f"[Job {task_id}] Stored unexpected error result in cache (Key: {content_cache_key}).")
+                if content_image_hash and content_cache_key: cache_timeout = settings.WECHAT_UPLOAD_FAILURE_CACHE_TIMEOUT; cache.set(content_cache_key, result_to_cache, timeout=cache_timeout); callback_upload_cache[content_cache_key] = result_to_cache; logger.debug(f"[Job {task_id}] Stored unexpected error result in cache (Key: {content_cache_key}).")
                 image_processing_warnings.append(f"Image upload error: {processed_content_path.name} ({type(e).__name__})"); return None, err
 
 
@@ -347,17 +355,14 @@ def start_processing_job(
             css_path = Path(css_path_setting)
             if not css_path.is_absolute() and hasattr(settings, 'BASE_DIR'):
                 css_path = Path(settings.BASE_DIR) / css_path
-            if css_path.is_file():
-                try:
-                    css_path_str = str(css_path)
-                    css_content = css_path.read_text(encoding="utf-8") # Read content here
-                    logger.debug(f"[Job {task_id}] Using preview CSS file: {css_path_str}")
-                except Exception as css_read_err:
-                     logger.warning(f"[Job {task_id}] Failed to read CSS file '{css_path}': {css_read_err}. CSS will not be embedded.")
-                     css_path_str = None # Invalidate path if read fails
-            else:
+            try:
+                css_content = html_processor.load_css(css_path) # Cached until the file changes
+                css_path_str = str(css_path)
+                logger.debug(f"[Job {task_id}] Using preview CSS file: {css_path_str}")
+            except FileNotFoundError:
                 logger.warning(f"[Job {task_id}] Preview CSS file configured but not found at {css_path}. Cannot embed CSS.")
-                css_path_str = None
+            except Exception as css_read_err:
+                logger.warning(f"[Job {task_id}] Failed to read CSS file '{css_path}': {css_read_err}. CSS will not be embedded.")
         else:
             logger.info(f"[Job {task_id}] No PREVIEW_CSS_FILE_PATH configured.")
 
@@ -386,7 +391,8 @@ def start_processing_job(
         article_html_content = processed_html_fragment
 
         # --- REFINED HTML STRUCTURE for Preview (Embed CSS, Center Body) ---
-        full_html_for_preview = f"""<!DOCTYPE html>
+        # Written as head / article / tail pieces so the article isn't copied into one more page-sized string
+        preview_head = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -414,12 +420,13 @@ def start_processing_job(
     </style>
 </head>
 <body>
-    {article_html_content}
+    """
+        preview_tail = """
 </body>
 </html>"""
         # --- End of REFINED HTML Structure ---
 
-        preview_path_rel_str = _generate_preview_file(full_html_for_preview, task_id)
+        preview_path_rel_str = _generate_preview_file((preview_head, article_html_content, preview_tail), task_id)
         job.preview_html_path = preview_path_rel_str
         job.status = PublishingJob.Status.PREVIEW_READY
         # If there were only warnings, clear the error message field *unless* a default title was needed (keep the warning)
@@ -668,9 +675,9 @@ def confirm_and_publish_job(task_id: uuid.UUID) -> Dict[str, Any]:
                     current_thumb_media_id = new_thumb_media_id
                     job.save(update_fields=JOB_THUMB_UPDATE_FIELDS)
                     logger.info(f"[Job {task_id}] Updated job record with new thumb_media_id: {new_thumb_media_id}")
-                    cover_image_hash_retry = calculate_file_hash(processed_cover_path_retry, algorithm='sha256')
+                    cover_image_hash_retry = calculate_file_hash(processed_cover_path_retry, algorithm=FINGERPRINT_ALGORITHM)
                     if cover_image_hash_retry:
-                        cache_key_retry = f"wechat_thumb_sha256_{cover_image_hash_retry}"; cache_timeout = settings.WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT
+                        cache_key_retry = f"wechat_thumb_{FINGERPRINT_ALGORITHM}_{cover_image_hash_retry}"; cache_timeout = settings.WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT
                         cache.set(cache_key_retry, new_thumb_media_id, timeout=cache_timeout)
                         logger.info(f"[Job {task_id}] Updated cache with new valid thumbnail Media ID (Key: {cache_key_retry}).")
                     else: logger.warning(f"[Job {task_id}] Could not calculate hash for processed cover image during retry, cache not updated.")
@@ -39,6 +39,7 @@ def setup_django_settings(settings, tmp_path):
         }
     }
     settings.WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT = None
+    settings.WECHAT_UPLOAD_FAILURE_CACHE_TIMEOUT = 600
     settings.WECHAT_APP_ID = "test_app_id"
     settings.WECHAT_SECRET = "test_secret"
     settings.WECHAT_BASE_URL = "https://api.example.com" # Mock base URL
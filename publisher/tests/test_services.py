@@ -10,7 +10,7 @@ from unittest.mock import MagicMock, call, patch, ANY
 import logging
 import re # Import re
 
-from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile, UploadedFile
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.text import slugify
@@ -19,6 +19,7 @@ from django.utils import timezone
 # Assuming PublishingJob, services, etc are correctly importable
 from publisher.models import PublishingJob
 from publisher import services
+from publishing_engine.utils.hashing_checking import FINGERPRINT_ALGORITHM
 # Import constants - adjust path if they live elsewhere or define directly
 try:
     from publisher.services import (
@@ -166,6 +167,22 @@ def test_save_uploaded_file_locally_success(tmp_path: Path, mock_uploaded_file_f
     assert result_path.read_bytes() == b"file data"
 
 
+@pytest.mark.django_db
+def test_save_uploaded_file_locally_temporary_file(tmp_path: Path, mocker):
+    """Uploads Django spooled to disk are copied file-to-file rather than read into memory."""
+    mocker.patch('django.conf.settings.MEDIA_ROOT', str(tmp_path / "media"))
+    temp_file = TemporaryUploadedFile("big image.jpg", "image/jpeg", 0, None)
+    temp_file.write(b"x" * 100_000)
+    temp_file.flush()
+    copy_spy = mocker.spy(services.shutil, 'copyfile')
+
+    result_path = services._save_uploaded_file_locally(temp_file, subfolder="big")
+
+    copy_spy.assert_called_once_with(temp_file.temporary_file_path(), result_path)
+    assert result_path.read_bytes() == b"x" * 100_000
+    temp_file.close()
+
+
 @pytest.mark.django_db
 def test_save_uploaded_file_locally_io_error(tmp_path: Path, mock_uploaded_file_factory: Callable, mocker):
     """Test handling of IOError during file saving by mocking open locally."""
@@ -215,6 +232,16 @@ def test_generate_preview_file_success(tmp_path: Path, mocker):
     assert expected_abs_path.is_file()
     assert expected_abs_path.read_text(encoding='utf-8') == html_content
 
+@pytest.mark.django_db
+def test_generate_preview_file_from_pieces(tmp_path: Path, mocker):
+    """Content given as pieces is written in order (no joined copy needed)."""
+    task_id = uuid.uuid4()
+    mocker.patch('django.conf.settings.MEDIA_ROOT', str(tmp_path / "media"))
+
+    relative_path_str = services._generate_preview_file(("<html><body>", "<p>中文</p>", "</body></html>"), task_id)
+
+    assert (tmp_path / "media" / relative_path_str).read_text(encoding='utf-8') == "<html><body><p>中文</p></body></html>"
+
 
 # --- Tests for start_processing_job ---
 
@@ -317,13 +344,13 @@ def test_start_processing_job_success_flow(tmp_path: Path, mock_uploaded_file_fa
     mock_ensure_image_size.assert_any_call(referenced_content_original_path, CONTENT_IMAGE_SIZE_LIMIT_KB)
 
     # Check hashing calls
-    mock_hash.assert_any_call(optimized_cover_path, algorithm='sha256')
-    mock_hash.assert_any_call(optimized_content_path, algorithm='sha256')
+    mock_hash.assert_any_call(optimized_cover_path, algorithm=FINGERPRINT_ALGORITHM)
+    mock_hash.assert_any_call(optimized_content_path, algorithm=FINGERPRINT_ALGORITHM)
     assert mock_hash.call_count == 2
 
     # Check cache lookups
-    mock_cache_instance.get.assert_any_call(f"wechat_thumb_sha256_optimized_cover_hash")
-    mock_cache_instance.get.assert_any_call(f"wechat_content_url_sha256_optimized_content_hash")
+    mock_cache_instance.get.assert_any_call(f"wechat_thumb_{FINGERPRINT_ALGORITHM}_optimized_cover_hash")
+    mock_cache_instance.get.assert_any_call(f"wechat_content_url_{FINGERPRINT_ALGORITHM}_optimized_content_hash")
 
     # Check uploads
     mock_upload_thumb.assert_called_once_with(access_token="DUMMY_ACCESS_TOKEN", thumb_path=optimized_cover_path, base_url=ANY)
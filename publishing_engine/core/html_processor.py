@@ -1,9 +1,16 @@
 # publishing_engine/core/html_processor.py
+import functools
+import os
 import re
+import threading
 from pathlib import Path
-from typing import Callable, Optional
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from markdown import Markdown
-from bs4 import BeautifulSoup, NavigableString
+from lxml import etree
+from lxml import html as lxml_html
+from lxml.html import HtmlElement
 import logging
 
 # Import settings to know where content images are saved by services.py
@@ -11,8 +18,42 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-# Matches src attributes that don't start with http://, https://, or data:
-LOCAL_IMAGE_SRC_PATTERN = re.compile(r"^(?!https?://|data:).+", re.IGNORECASE)
+# Image srcs with these prefixes (case-insensitive) are remote and left untouched
+_REMOTE_PREFIXES = ('http://', 'https://', 'data:')
+
+# Plugins giving mistune roughly the feature set of python-markdown's 'extra'
+MISTUNE_PLUGINS = ['table', 'strikethrough', 'footnotes', 'def_list', 'abbr', 'task_lists']
+# pulldown-cmark extensions enabled for the 'pyromark' engine (no syntax highlighting or abbr)
+PYROMARK_OPTIONS = ('ENABLE_TABLES', 'ENABLE_STRIKETHROUGH', 'ENABLE_FOOTNOTES', 'ENABLE_TASKLISTS')
+
+# Markdown processor built once per process; extension loading is expensive.
+# reset() clears per-document state (toc, footnotes) between conversions, and the
+# lock keeps concurrent requests from sharing that state mid-conversion.
+_MD_PROCESSOR = Markdown(output_format='html5', extensions=[
+    'extra', 'codehilite', 'toc', 'fenced_code', 'tables', 'sane_lists',
+])
+_MD_LOCK = threading.Lock()
+
+# Maximum number of concurrent image uploads (WeChat rate limits apply)
+MAX_UPLOAD_WORKERS = 4
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+# Cheap pre-scan on the raw HTML so heading-free documents skip the tree walk
+HEADING_TAG_PATTERN = re.compile(r'<h[1-6]', re.IGNORECASE)
+# The Markdown output is parsed as children of this wrapper; see _serialize_fragment
+_FRAGMENT_PARENT = 'div'
+# Image with an unbracketed destination and no title, e.g. ![alt](my image.png).
+# python-markdown accepts spaces there; CommonMark engines need ![alt](<my image.png>).
+# Fenced code blocks and code spans are matched first (and kept verbatim) so image
+# syntax quoted inside code isn't rewritten.
+_IMAGE_DESTINATION_RE = re.compile(
+    r'(?P<code>'
+    r'^[ ]{0,3}(?P<fence>(?P<fch>[`~])(?P=fch){2,})[^\n]*\n(?:[\s\S]*?^[ ]{0,3}(?P=fence)(?P=fch)*[ \t]*$|[\s\S]*\Z)'
+    r'|(?<!`)(?P<ticks>`+)(?!`)(?:(?!\n[ \t]*\n)[\s\S])*?(?<!`)(?P=ticks)(?!`)'
+    r')'
+    r'|(?P<open>!\[[^\]\n]*\]\()[ \t]*(?P<dest>[^()<>\s"\'](?:[^()<>\n"\']*[^()<>\s"\'])?)[ \t]*(?P<close>\))',
+    re.MULTILINE,
+)
 
 # --- Helper: _read_file ---
 def _read_file(file_path: Path | str) -> str:
@@ -28,16 +69,129 @@ def _read_file(file_path: Path | str) -> str:
         logger.exception(f"Error reading file {file_path}: {e}")
         raise
 
+# --- Helper: _load_css_cached ---
+@functools.lru_cache(maxsize=16)
+def _load_css_cached(path_str: str, mtime: float) -> str:
+    """Read and strip a CSS file. mtime is part of the cache key so edits invalidate the entry."""
+    return _read_file(path_str).strip()
+
+# --- Helper: _get_mistune_markdown ---
+@functools.lru_cache(maxsize=1)
+def _get_mistune_markdown() -> Optional[Callable[[str], str]]:
+    """
+    Builds the mistune converter once. Returns None if mistune isn't installed,
+    in which case callers fall back to python-markdown.
+    """
+    try:
+        import mistune
+    except ImportError:
+        logger.warning("MARKDOWN_ENGINE is 'mistune' but mistune is not installed; falling back to python-markdown.")
+        return None
+
+    class _CodeHiliteRenderer(mistune.HTMLRenderer):
+        """Renders fenced code blocks the way python-markdown's codehilite extension does."""
+
+        def block_code(self, code: str, info: Optional[str] = None) -> str:
+            try:
+                from pygments import highlight
+                from pygments.formatters import HtmlFormatter
+                from pygments.lexers import TextLexer, get_lexer_by_name, guess_lexer
+                from pygments.util import ClassNotFound
+            except ImportError:
+                return super().block_code(code, info)
+
+            lang = info.strip().split(None, 1)[0] if info and info.strip() else None
+            try:
+                # codehilite guesses the language when the fence doesn't name one
+                lexer = get_lexer_by_name(lang) if lang else guess_lexer(code)
+            except ClassNotFound:
+                lexer = TextLexer()
+            return highlight(code, lexer, HtmlFormatter(cssclass='codehilite', wrapcode=True))
+
+    return mistune.create_markdown(renderer=_CodeHiliteRenderer(escape=False), plugins=MISTUNE_PLUGINS)
+
+
+# --- Helper: _get_pyromark_markdown ---
+@functools.lru_cache(maxsize=1)
+def _get_pyromark_markdown() -> Optional[Callable[[str], str]]:
+    """
+    Builds the pyromark (Rust pulldown-cmark) converter once. Returns None if pyromark
+    isn't installed, in which case callers fall back to python-markdown.
+    """
+    try:
+        import pyromark
+    except ImportError:
+        logger.warning("MARKDOWN_ENGINE is 'pyromark' but pyromark is not installed; falling back to python-markdown.")
+        return None
+    options = pyromark.Options(0)
+    for name in PYROMARK_OPTIONS:
+        options |= getattr(pyromark.Options, name)
+    return pyromark.Markdown(options=options).html
+
+
+# --- Helper: _bracket_spaced_image_destinations ---
+def _bracket_spaced_image_destinations(md_content: str) -> str:
+    """Wraps image paths containing spaces in <...> so CommonMark engines still parse them as images."""
+    if '![' not in md_content:
+        return md_content
+    def _bracket(match: re.Match) -> str:
+        if match.group('code') is not None or not any(ch in match.group('dest') for ch in ' \t'):
+            return match.group(0)
+        return f"{match.group('open')}<{match.group('dest')}>{match.group('close')}"
+    return _IMAGE_DESTINATION_RE.sub(_bracket, md_content)
+
+
+# --- Helper: _markdown_to_html ---
+def _markdown_to_html(md_content: str) -> str:
+    """Converts Markdown with the engine chosen by settings.MARKDOWN_ENGINE."""
+    engine = getattr(settings, 'MARKDOWN_ENGINE', 'python-markdown')
+    if engine == 'mistune':
+        mistune_markdown = _get_mistune_markdown()
+        if mistune_markdown is not None:
+            return mistune_markdown(_bracket_spaced_image_destinations(md_content))
+    elif engine == 'pyromark':
+        pyromark_markdown = _get_pyromark_markdown()
+        if pyromark_markdown is not None:
+            return pyromark_markdown(_bracket_spaced_image_destinations(md_content))
+
+    # python-markdown: the original (highest-fidelity) renderer, using the shared processor
+    with _MD_LOCK:
+        _MD_PROCESSOR.reset()
+        return _MD_PROCESSOR.convert(md_content)
+
+
+# --- Helper: _build_central_image_index ---
+def _build_central_image_index(central_image_dir: Path) -> Dict[str, List[Path]]:
+    """
+    List the central content_images dir once and group its files by suffix,
+    so each <img> lookup avoids a fresh glob (directory scan) of its own.
+    """
+    index: Dict[str, List[Path]] = {}
+    if not central_image_dir.is_dir():
+        return index
+    try:
+        with os.scandir(central_image_dir) as entries:
+            for entry in entries:
+                # glob() skips hidden files; keep the same behaviour
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                suffix = os.path.splitext(entry.name)[1]
+                index.setdefault(suffix, []).append(Path(entry.path))
+    except OSError as e:
+        logger.warning(f"Error listing central content dir {central_image_dir}: {e}")
+    return index
+
 # --- Helper: _find_and_replace_local_images ---
-# (No changes needed in this helper based on test results)
 def _find_and_replace_local_images(
-    soup: BeautifulSoup,
+    root: HtmlElement,
     markdown_dir: Path,
     image_uploader: Callable[[Path], Optional[str]] # Expects func(path) -> Optional[url]
 ) -> None:
     """
     Find local image sources, attempt to resolve paths (relative to MD first,
     then central content_images dir), call uploader, and replace src.
+    Path resolution happens first; the uploads then run concurrently, once per
+    distinct file, and every <img> referencing that file gets the same URL.
     """
     logger.info("Searching for local images in HTML to replace with WeChat URLs...")
     images_processed = 0
@@ -45,149 +199,179 @@ def _find_and_replace_local_images(
     # Define where side-uploaded content images are stored by services.py
     content_images_subfolder = 'uploads/content_images'
     central_image_dir = Path(settings.MEDIA_ROOT) / content_images_subfolder
+    # (img tag, original src, resolved local path) awaiting upload
+    pending_uploads: List[Tuple[HtmlElement, str, Path]] = []
+    # Central dir listing, built lazily on the first image that needs it
+    central_index: Optional[Dict[str, List[Path]]] = None
 
-    for img in soup.find_all('img'):
+    for img in root.iter('img'):
         src = img.get('src')
         # Ensure alt attribute exists, even if empty, for accessibility/validation
-        img['alt'] = img.get('alt', '')
+        if img.get('alt') is None:
+            img.set('alt', '')
 
-        if not src or not LOCAL_IMAGE_SRC_PATTERN.match(src):
+        if not src or src.lower().startswith(_REMOTE_PREFIXES):
             # Skip if src is missing, empty, or already an absolute URL/data URI
             continue
 
         logger.debug(f"Found potential local image source: '{src}'")
         resolved_image_path: Optional[Path] = None
-        image_filename = Path(src).name # Extract filename for central search
+        # CommonMark engines (mistune, pyromark) percent-encode spaces and non-ASCII
+        # characters in srcs; python-markdown leaves them as written
+        local_src = unquote(src) if '%' in src else src
+        image_filename = Path(local_src).name # Extract filename for central search
 
         # --- Path Resolution Strategy ---
         # 1. Try relative to markdown dir (most common case for Markdown files)
-        try:
-            # Use resolve() to normalize paths (e.g., handle ../) and check existence
-            path_relative_to_md = (markdown_dir / src).resolve(strict=True)
-            if path_relative_to_md.is_file():
-                resolved_image_path = path_relative_to_md
-                logger.debug(f"Resolved image '{src}' relative to markdown dir: {resolved_image_path}")
-        except FileNotFoundError:
+        # normpath handles ../ lexically; a single isfile() stat checks existence
+        # (resolve(strict=True) would stat every path component).
+        candidate = os.path.abspath(os.path.join(markdown_dir, src))
+        if local_src != src and not os.path.isfile(candidate):
+            candidate = os.path.abspath(os.path.join(markdown_dir, local_src))
+        if os.path.isfile(candidate):
+            resolved_image_path = Path(candidate)
+            logger.debug(f"Resolved image '{src}' relative to markdown dir: {resolved_image_path}")
+        else:
             # This is expected if the path is not relative or doesn't exist there
             logger.debug(f"Image '{src}' not found relative to markdown dir {markdown_dir}.")
-        except Exception as e:
-            # Log other potential errors during resolution (e.g., permission issues)
-            logger.warning(f"Error resolving image '{src}' relative to markdown dir: {e}")
 
         # 2. If not found relative, try finding by filename in the central content_images dir
         if not resolved_image_path:
             logger.debug(f"Attempting to find image filename '{image_filename}' in central dir: {central_image_dir}")
             found_in_central = False
-            if central_image_dir.is_dir():
-                src_path = Path(src)
+            if central_index is None:
+                central_index = _build_central_image_index(central_image_dir)
+            if central_index:
+                src_path = Path(local_src)
                 src_stem = src_path.stem
                 src_suffix = src_path.suffix.lower() # Use lower case for comparison
-                try:
-                    # Use glob to find files matching the pattern stem*suffix
-                    possible_matches = list(central_image_dir.glob(f"{src_stem}*{src_suffix}"))
-                    if possible_matches:
-                        # Use the first match found. Might need smarter logic if multiple exist.
-                        match_path = possible_matches[0].resolve(strict=True)
-                        if match_path.is_file():
-                             resolved_image_path = match_path
-                             logger.debug(f"Resolved image '{src}' (matched stem/suffix) in central content dir: {resolved_image_path}")
-                             found_in_central = True
-                        else:
-                             logger.warning(f"Glob matched '{possible_matches[0]}' but file check failed after resolve.")
-                except FileNotFoundError:
-                     logger.debug(f"Glob match for '{image_filename}' resolved, but strict file check failed.")
-                except Exception as e:
-                     logger.warning(f"Error searching for '{image_filename}' in central content dir: {e}")
+                # Same semantics as glob(f"{src_stem}*{src_suffix}"), but served from the index.
+                # Index entries were already checked with is_file() when the dir was listed.
+                possible_matches = [p for p in central_index.get(src_suffix, []) if p.stem.startswith(src_stem)]
+                if possible_matches:
+                    # Use the first match found. Might need smarter logic if multiple exist.
+                    resolved_image_path = possible_matches[0]
+                    logger.debug(f"Resolved image '{src}' (matched stem/suffix) in central content dir: {resolved_image_path}")
+                    found_in_central = True
 
             if not found_in_central:
                  logger.debug(f"Image filename '{image_filename}' not found in central content dir {central_image_dir}.")
         # --- End Path Resolution ---
 
 
-        # --- Upload and Replace Src ---
         if resolved_image_path:
+            pending_uploads.append((img, src, resolved_image_path))
+        else:
+            # Image specified in Markdown could not be found locally
+            logger.error(f"Local image file could not be located for src='{src}'. Checked relative to MD and in central dir. Keeping original src.")
+            images_failed += 1
+
+    # --- Upload and Replace Src ---
+    # Uploads are network-bound round trips to WeChat, so run them concurrently.
+    # Worker count stays small to respect WeChat's upload rate limits.
+    if pending_uploads:
+        def _safe_upload(resolved_path: Path) -> Optional[str]:
             try:
-                logger.debug(f"Calling image uploader for resolved path: {resolved_image_path}")
+                logger.debug(f"Calling image uploader for resolved path: {resolved_path}")
                 # The image_uploader is the adapted callback from services.py
-                wechat_url = image_uploader(resolved_image_path)
-                if wechat_url:
-                    img['src'] = wechat_url
-                    images_processed += 1
-                    logger.debug(f"Replaced original src='{src}' with WeChat URL: '{wechat_url}'")
-                else:
-                    # Callback failed (e.g., size issue, upload error, API error)
-                    logger.warning(f"Image upload/processing failed for: {resolved_image_path} (original src: '{src}'). Keeping original src.")
-                    images_failed += 1
+                return image_uploader(resolved_path)
             except Exception as e:
                 # Catch unexpected errors during the callback execution itself
-                logger.exception(f"Unexpected error during image_uploader callback for {resolved_image_path} (original src='{src}'): {e}")
+                logger.exception(f"Unexpected error during image_uploader callback for {resolved_path}: {e}")
+                return None
+
+        # An image used several times is uploaded once: the services.py callback (size
+        # check, optimized copy, upload cache) isn't safe to run twice at once for one file
+        unique_paths = list(dict.fromkeys(path for _, _, path in pending_uploads))
+        max_workers = min(MAX_UPLOAD_WORKERS, len(unique_paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            urls_by_path = dict(zip(unique_paths, executor.map(_safe_upload, unique_paths)))
+
+        for img, src, resolved_image_path in pending_uploads:
+            wechat_url = urls_by_path[resolved_image_path]
+            if wechat_url:
+                img.set('src', wechat_url)
+                images_processed += 1
+                logger.debug(f"Replaced original src='{src}' with WeChat URL: '{wechat_url}'")
+            else:
+                # Callback failed (e.g., size issue, upload error, API error)
+                logger.warning(f"Image upload/processing failed for: {resolved_image_path} (original src: '{src}'). Keeping original src.")
                 images_failed += 1
-        else:
-            # Image specified in Markdown could not be found locally
-            logger.error(f"Local image file could not be located for src='{src}'. Checked relative to MD and in central dir. Keeping original src.")
-            images_failed += 1
-        # --- End Upload and Replace ---
+    # --- End Upload and Replace ---
 
     logger.info(f"Image processing complete. Replaced: {images_processed}, Failed/Skipped: {images_failed}.")
 
 
-# --- Helper: _wrap_heading_content ---
-# (No changes needed in this helper based on test results)
-def _wrap_heading_content(soup: BeautifulSoup) -> None:
-    """Wrap headings' text content in span elements for consistent styling, preserving attributes."""
-    for header in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        # Check if already wrapped to prevent double wrapping if run multiple times
-        if header.find('span', class_='content', recursive=False):
-            continue
+# --- Helper: _wrap_header ---
+def _wrap_header(header: HtmlElement) -> None:
+    """Wrap one heading's content in prefix/content/suffix spans, preserving attributes."""
+    # Check if already wrapped to prevent double wrapping if run multiple times
+    if any(child.tag == 'span' and 'content' in (child.get('class') or '').split() for child in header):
+        return
+
+    # Capture the existing text and child elements (tails travel with their element)
+    text = header.text
+    children = list(header)
+    header.text = None
+
+    # Add structural spans; attributes on the header itself are untouched
+    etree.SubElement(header, 'span', {'class': 'prefix'})
+    content_span = etree.SubElement(header, 'span', {'class': 'content'})
+    etree.SubElement(header, 'span', {'class': 'suffix'})
+
+    # Move the original content into the central 'content' span,
+    # dropping whitespace-only text runs between nodes
+    content_span.text = text if text and text.strip() else None
+    for child in children:
+        if child.tail is not None and not child.tail.strip():
+            child.tail = None
+        content_span.append(child)
+
+
+# --- Helper: _transform_headings ---
+def _transform_headings(root: HtmlElement) -> None:
+    """Single pass over the headings: drop 'id' (WeChat conflicts) and wrap content in spans."""
+    for header in root.iter(*HEADING_TAGS):
+        header.attrib.pop('id', None)
+        _wrap_header(header)
+
+
+# --- Helper: _serialize_fragment ---
+def _serialize_fragment(root: HtmlElement) -> str:
+    """Serializes the children of the wrapper element created by _parse_fragment."""
+    serialized = lxml_html.tostring(root, encoding='unicode')
+    # Strip the wrapper's own '<div>' and '</div>'
+    return serialized[len(_FRAGMENT_PARENT) + 2:-(len(_FRAGMENT_PARENT) + 3)]
 
-        original_attrs = header.attrs.copy() # Preserve original attributes like id, class
-        content_html = ''.join(str(c) for c in header.contents) # Get inner HTML as string
-
-        header.clear() # Remove original content
-        header.attrs = original_attrs # Restore attributes to the header tag
-
-        # Add structural spans (empty for now, content added next)
-        header.append(soup.new_tag('span', **{'class': 'prefix'}))
-        content_span = soup.new_tag('span', **{'class': 'content'})
-        header.append(content_span)
-        header.append(soup.new_tag('span', **{'class': 'suffix'}))
-
-        # Parse the original inner HTML to handle nested tags correctly
-        # Use 'html.parser' as it's built-in and sufficient here
-        # If content_html is empty, BeautifulSoup creates empty body/html tags, but .contents will be empty or just whitespace
-        parsed_content = BeautifulSoup(content_html or "", 'html.parser') # Use empty string if no content
-
-        # Append children of parsed content to the central 'content' span
-        # This avoids wrapping the entire parsed structure in extra <html><body> tags
-        # Use list() to iterate over a copy as we modify the contents
-        for child in list(parsed_content.contents):
-             # Skip potential empty NavigableString if content_html was empty or whitespace only
-            if isinstance(child, NavigableString) and not child.strip():
-                continue
-            content_span.append(child.extract()) # extract() removes from parsed_content and returns
-
-
-# --- Helper: _remove_heading_ids ---
-# (No changes needed in this helper based on test results)
-def _remove_heading_ids(soup: BeautifulSoup) -> None:
-    """Remove 'id' attributes from heading tags to avoid conflicts in WeChat."""
-    for header in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        if header.has_attr('id'):
-            del header['id']
-
-
-# --- Helper: _extract_body_content ---
-# (No changes needed in this helper based on test results)
-def _extract_body_content(soup: BeautifulSoup) -> str:
-    """Extracts the inner HTML of the body tag, or the whole soup if no body."""
-    body = soup.find('body')
-    if body:
-        # Preserves the inner content of the body tag generated by Markdown
-        return body.decode_contents()
-    else:
-        # If markdown didn't create a full document, decode the whole soup's content
-        # This handles cases where md_content is just a paragraph or simple text
-        return "".join(str(content) for content in soup.contents)
+
+# --- Helper: _parse_fragment ---
+def _parse_fragment(html_body: str) -> HtmlElement:
+    """Parses an HTML fragment with lxml under a bare wrapper element."""
+    return lxml_html.fragment_fromstring(html_body, create_parent=_FRAGMENT_PARENT)
+
+
+# --- Helper: _file_mtime ---
+def _file_mtime(path: Path | str) -> Optional[float]:
+    """Returns the file's mtime, or None if it can't be stat'ed."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+# --- load_css ---
+def load_css(css_path: Path | str) -> str:
+    """
+    Returns the stripped content of a CSS file, read once per process and re-read
+    only when the file's mtime changes (so edits show up without a restart).
+
+    Raises:
+        FileNotFoundError: If the CSS file does not exist.
+    """
+    css_mtime = _file_mtime(css_path)
+    if css_mtime is None:
+        raise FileNotFoundError(f"CSS file not found: {css_path}")
+    return _load_css_cached(str(css_path), css_mtime)
 
 
 # --- Main Function: process_html_content ---
@@ -214,36 +398,28 @@ def process_html_content(
     markdown_dir = Path(markdown_file_path).parent
     logger.info(f"Markdown directory set to: {markdown_dir}")
 
-    # Initialize Markdown processor with desired extensions
-    md_processor = Markdown(output_format='html5', extensions=[
-        'extra', 'codehilite', 'toc', 'fenced_code', 'tables', 'sane_lists',
-    ])
-
     # Convert Markdown to HTML fragment
-    html_body = md_processor.convert(md_content)
+    html_body = _markdown_to_html(md_content)
 
-    # Parse the generated HTML with BeautifulSoup for manipulation
-    try:
-        soup = BeautifulSoup(html_body, 'lxml')
-    except ImportError:
-        logger.warning("lxml not found, falling back to html.parser for HTML processing.")
-        soup = BeautifulSoup(html_body, 'html.parser')
+    # Parse the generated HTML with lxml directly for manipulation
+    root = _parse_fragment(html_body)
 
     # --- Apply HTML transformations ---
-    _remove_heading_ids(soup)
-    _wrap_heading_content(soup)
-    _find_and_replace_local_images(soup, markdown_dir, image_uploader)
+    if HEADING_TAG_PATTERN.search(html_body):
+        _transform_headings(root)
+    _find_and_replace_local_images(root, markdown_dir, image_uploader)
 
     # --- Extract the processed body content ---
-    body_fragment = _extract_body_content(soup)
+    body_fragment = _serialize_fragment(root)
 
     # --- Prepare CSS ---
     style_tag = "" # Default to no style tag
     if css_path:
         css_file_path = Path(css_path)
-        if css_file_path.is_file():
+        css_mtime = _file_mtime(css_file_path)
+        if css_mtime is not None:
             try:
-                css_content = _read_file(css_file_path).strip()
+                css_content = _load_css_cached(str(css_file_path), css_mtime)
                 style_tag = f'<style type="text/css">\n{css_content}\n</style>\n' # Add newline
             except Exception as e:
                 logger.exception(f"Error reading CSS file {css_file_path}. Proceeding without CSS.")
@@ -5,13 +5,22 @@ Ensures UTF-8 encoding is used for reading.
 Validates presence and basic types of required metadata fields.
 """
 
+import copy
+import functools
 import yaml
 import logging
+import re
 from pathlib import Path
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Prefer the libyaml-backed loader (C extension); fall back to the pure-Python one
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
 # --- Constants ---
 YAML_DELIMITER: str = '---'
 # Define required fields and their expected types (example)
@@ -24,16 +33,64 @@ REQUIRED_FIELDS_WITH_TYPES: Dict[str, type] = {
     # "date": str, # Or datetime.date after parsing
     # "tags": list,
 }
+# Frontmatter is read in small chunks; the closing delimiter is expected well
+# within the scan limit, past which the whole file is searched instead.
+FRONTMATTER_READ_CHUNK_SIZE: int = 4096
+FRONTMATTER_SCAN_LIMIT: int = 64 * 1024
+# Opening delimiter line, then the YAML block up to the closing delimiter line.
+# Handles LF and CRLF files in one pass over the raw bytes.
+_FRONTMATTER_START_RE = re.compile(rb'\A---\r?\n')
+_FRONTMATTER_RE = re.compile(rb'\A---\r?\n(.*?)\r?\n---\r?\n', re.DOTALL)
+
+
+def _split_frontmatter(path: Path) -> Tuple[bool, Optional[str], str]:
+    """
+    Reads the file as bytes and splits it at the YAML frontmatter delimiters.
+    Only the head of the file is scanned for the closing delimiter.
 
-def extract_metadata_and_content(filepath: str | Path) -> Tuple[Dict[str, Any], str]:
+    Returns:
+        Tuple[bool, Optional[str], str]: (starts with delimiter, YAML text or None
+        if no closing delimiter was found, body text).
+    """
+    with path.open('rb') as f:
+        head = f.read(FRONTMATTER_READ_CHUNK_SIZE)
+        if not _FRONTMATTER_START_RE.match(head):
+            # No frontmatter: everything is body
+            return False, None, (head + f.read()).decode('utf-8')
+
+        match = _FRONTMATTER_RE.match(head)
+        while match is None and len(head) < FRONTMATTER_SCAN_LIMIT:
+            chunk = f.read(FRONTMATTER_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            head += chunk
+            match = _FRONTMATTER_RE.match(head)
+
+        raw = head + f.read()
+
+    if match is None:
+        # Scan limit reached (or EOF): fall back to searching the full file
+        match = _FRONTMATTER_RE.match(raw)
+        if match is None:
+            return True, None, raw.decode('utf-8')
+
+    # Both slices start/end on ASCII newlines, so they decode independently
+    return True, match.group(1).decode('utf-8'), raw[match.end():].decode('utf-8')
+
+
+def extract_metadata_and_content(filepath: str | Path, validate: bool = True) -> Tuple[Dict[str, Any], str]:
     """
     Reads Markdown (UTF-8), extracts/validates YAML frontmatter, returns metadata & body.
+    Results are cached per (path, mtime), so repeat calls for an unchanged file skip the parse.
+    This is the single frontmatter parser; other modules delegate here.
 
     Args:
         filepath: Path to the markdown file.
+        validate: Check REQUIRED_FIELDS_WITH_TYPES when frontmatter is present.
 
     Returns:
         Tuple[Dict[str, Any], str]: (Validated metadata dict (potentially empty), Markdown body string).
+        The metadata dict is a fresh copy that callers may modify.
 
     Raises:
         FileNotFoundError: If the markdown file does not exist.
@@ -42,46 +99,61 @@ def extract_metadata_and_content(filepath: str | Path) -> Tuple[Dict[str, Any],
         RuntimeError: For file reading issues.
     """
     path = Path(filepath)
-    logger.info(f"Extracting metadata and content from: {path}")
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        logger.error("Markdown file not found: %s", path)
+        raise # Re-raise FileNotFoundError
+    except OSError as e:
+        logger.exception("Error reading file %s", path)
+        raise RuntimeError(f"Failed to read file {path}") from e
+
+    has_start_delimiter, metadata, body_content = _cached_parse(str(path), mtime_ns)
+    if validate:
+        _validate_metadata(metadata, has_start_delimiter, path)
+    # Callers (e.g. publisher.services) update the dict, so never hand out the cached one
+    return copy.deepcopy(metadata), body_content
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_parse(path_str: str, mtime_ns: int) -> Tuple[bool, Dict[str, Any], str]:
+    """Memoized parse; mtime_ns is part of the key so edited files are re-read."""
+    return _parse_markdown_file(Path(path_str))
+
+
+def _parse_markdown_file(path: Path) -> Tuple[bool, Dict[str, Any], str]:
+    """
+    Uncached read + YAML parse (no validation).
 
-    # --- Read the file directly using UTF-8 ---
+    Returns:
+        Tuple[bool, Dict[str, Any], str]: (starts with delimiter, metadata, stripped body).
+    """
+    logger.info("Extracting metadata and content from: %s", path)
+
+    # --- Read the file as UTF-8, scanning only its head for frontmatter ---
     try:
-        full_content = path.read_text(encoding='utf-8')
+        has_start_delimiter, yaml_text, body_content = _split_frontmatter(path)
     except FileNotFoundError:
-        logger.error(f"Markdown file not found: {path}")
+        logger.error("Markdown file not found: %s", path)
         raise # Re-raise FileNotFoundError
     except Exception as e:
-        logger.exception(f"Error reading file {path}")
+        logger.exception("Error reading file %s", path)
         raise RuntimeError(f"Failed to read file {path}") from e
 
     metadata: Dict[str, Any] = {}
-    body_content: str = full_content # Default: assume all content is body
 
     # --- YAML Frontmatter Parsing ---
-    # Normalize line endings for consistent splitting
-    normalized_content = full_content.replace('\r\n', '\n')
-    start_delimiter = YAML_DELIMITER + '\n'
-    end_delimiter = '\n' + YAML_DELIMITER + '\n'
-
-    if normalized_content.startswith(start_delimiter):
-        # Find the end delimiter position after the start delimiter
-        end_delimiter_search_start = len(start_delimiter)
-        end_delimiter_pos = normalized_content.find(end_delimiter, end_delimiter_search_start)
-
-        if end_delimiter_pos != -1:
-            # Extract YAML block
-            yaml_part = normalized_content[end_delimiter_search_start : end_delimiter_pos].strip()
-            # Extract body content (starts after the ending delimiter)
-            body_content_start = end_delimiter_pos + len(end_delimiter)
-            body_content = full_content[body_content_start:] # Use original content to preserve original newlines in body
-            logger.debug(f"Found YAML delimiters. YAML part length: {len(yaml_part)}, Body content start index: {body_content_start}")
+    if has_start_delimiter:
+        if yaml_text is not None:
+            yaml_part = yaml_text.strip()
+            logger.debug("Found YAML delimiters. YAML part length: %d, Body content length: %d", len(yaml_part), len(body_content))
 
             if not yaml_part:
                 logger.debug("Empty content between YAML frontmatter delimiters.")
                 metadata = {}
             else:
                 try:
-                    loaded_yaml = yaml.safe_load(yaml_part)
+                    loaded_yaml = yaml.load(yaml_part, Loader=_SafeLoader)
                     if isinstance(loaded_yaml, dict):
                         metadata = loaded_yaml
                         logger.debug("Successfully parsed YAML frontmatter.")
@@ -89,7 +161,7 @@ def extract_metadata_and_content(filepath: str | Path) -> Tuple[Dict[str, Any],
                         metadata = {}
                         logger.debug("YAML frontmatter parsed as None (empty).")
                     else:
-                        logger.error(f"YAML frontmatter content in {path} is not a dictionary (key-value pairs). Type: {type(loaded_yaml)}")
+                        logger.error("YAML frontmatter content in %s is not a dictionary (key-value pairs). Type: %s", path, type(loaded_yaml))
                         raise ValueError("YAML frontmatter content must parse to a dictionary.")
                 except yaml.YAMLError as e:
                     error_msg = f"Invalid YAML syntax in frontmatter of {path}: {e}"
@@ -98,18 +170,20 @@ def extract_metadata_and_content(filepath: str | Path) -> Tuple[Dict[str, Any],
 
         else:
             # Found start delimiter but no proper end delimiter
-            logger.warning(f"Found starting '---' but no valid closing '---' delimiter in {path}. Treating all as body content.")
-            body_content = full_content # Revert to full content as body
+            logger.warning("Found starting '---' but no valid closing '---' delimiter in %s. Treating all as body content.", path)
             metadata = {}
     else:
         # No YAML frontmatter delimiter found at the start
-        logger.debug(f"No YAML frontmatter found (doesn't start with '---'). Treating all content as body.")
-        body_content = full_content
+        logger.debug("No YAML frontmatter found (doesn't start with '---'). Treating all content as body.")
         metadata = {}
 
-    # --- Metadata Validation ---
+    return has_start_delimiter, metadata, body_content.strip()
+
+
+def _validate_metadata(metadata: Dict[str, Any], has_start_delimiter: bool, path: Path) -> None:
+    """Raises ValueError if frontmatter is present but required fields are missing or mistyped."""
     # Check required fields only if metadata was potentially found
-    if metadata or normalized_content.startswith(start_delimiter):
+    if metadata or has_start_delimiter:
         errors: List[str] = []
         for field, expected_type in REQUIRED_FIELDS_WITH_TYPES.items():
             if field not in metadata or not metadata[field]:
@@ -119,16 +193,11 @@ def extract_metadata_and_content(filepath: str | Path) -> Tuple[Dict[str, Any],
             # Add more specific type checks if needed (e.g., list elements, date format)
 
         if errors:
-            error_msg = f"Metadata validation failed for {filepath}: {'; '.join(errors)}"
+            error_msg = f"Metadata validation failed for {path}: {'; '.join(errors)}"
             logger.error(error_msg)
             raise ValueError(error_msg) # Raise error for missing/invalid required fields
 
-        logger.info(f"Metadata extracted and validated successfully from {filepath}")
+        logger.info("Metadata extracted and validated successfully from %s", path)
     else:
         # No frontmatter found, assume it's optional
-        logger.info(f"No valid metadata found or parsed from {filepath}. Proceeding with body content.")
-        metadata = {} # Ensure metadata is empty dict if no frontmatter
-
-    # Return the potentially empty metadata dict and the stripped body content
-    return metadata, body_content.strip()
-
+        logger.info("No valid metadata found or parsed from %s. Proceeding with body content.", path)
@@ -4,7 +4,8 @@ payload_builder.py
 Constructs JSON payload for WeChat Draft API.
 
 Dependencies:
-    - BeautifulSoup (bs4)
+    - html.parser (streaming digest extraction)
+    - selectolax (optional) / lxml, fallback digest extraction
     - logging
 
 Inputs:
@@ -16,31 +17,237 @@ Output:
     - JSON payload dictionary for WeChat Draft API
 """
 # publishing_engine/core/payload_builder.py
-from typing import Dict, Any
-from bs4 import BeautifulSoup
+import hashlib
+import html
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from html.parser import HTMLParser
+from itertools import islice
+from typing import Dict, Any, Iterator, List, Optional
 import logging
 
+# Optional C-backed (lexbor) parser for the full-text fallback; lxml's pull parser otherwise
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Optional grapheme-cluster matching (\X); unicodedata-based fallback otherwise
+try:
+    import regex
+    _GRAPHEME_RE = regex.compile(r'\X')
+except ImportError:
+    _GRAPHEME_RE = None
+
 logger = logging.getLogger(__name__)
 
 MAX_DIGEST_LENGTH = 54
+# Optional article fields copied from metadata, with their defaults
+_ARTICLE_DEFAULTS = (
+    ("author", ""),
+    ("content_source_url", ""),
+    ("need_open_comment", 0),
+    ("only_fans_can_comment", 0),
+)
+
+# Text inside these tags is not article text
+NON_TEXT_TAGS = frozenset({'style', 'script', 'template'})
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Regex fast path: strip tags from only the head of the document
+DIGEST_FAST_PATH_CHARS = 2048
+# Margin so an entity cut off by the head slice can't reach the digest
+_FAST_PATH_MARGIN = 16
+_TAG_RE = re.compile(r'<[^>]*>')
+_NON_TEXT_BLOCK_RE = re.compile(r'<(style|script|template)\b[^>]*>.*?</\1\s*>|<!--.*?-->', re.DOTALL | re.IGNORECASE)
+_UNCLOSED_NON_TEXT_RE = re.compile(r'<(?:style|script|template)\b|<!--', re.IGNORECASE)
+# A '>' inside a quoted attribute value (e.g. <p title="a>b">), which would end _TAG_RE early
+_QUOTED_GT_RE = re.compile(r'<[^>]*?=\s*(?:"[^"]*>|\'[^\']*>)')
+# Chunk size fed to lxml's pull parser by the full-parse fallback
+PULL_PARSER_FEED_CHARS = 4096
+
+# Digests memoized by the blake2b hash of their HTML (LRU); the HTML itself isn't kept
+DIGEST_CACHE_SIZE = 256
+_DIGEST_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_DIGEST_CACHE_LOCK = threading.Lock() # Multi-article drafts generate digests in threads
+
+
+class _DigestComplete(Exception):
+    """Raised by _DigestTextCollector once enough text has been collected."""
+
+
+class _DigestTextCollector(HTMLParser):
+    """
+    Streaming text collector: gathers visible text until `limit` characters are
+    collected, then aborts the parse, so only the head of the article is scanned.
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.parts: List[str] = []
+        self.length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in NON_TEXT_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in NON_TEXT_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        text = _WHITESPACE_RE.sub(' ', data).strip()
+        if text:
+            self.parts.append(text)
+            self.length += len(text) + 1 # +1 for the joining space
+            if self.length >= self.limit:
+                raise _DigestComplete
+
+
+def _truncate_graphemes(text: str, limit: int) -> str:
+    """
+    Truncates text to at most `limit` user-perceived characters without splitting
+    a grapheme cluster (emoji sequences, base letter + combining marks).
+    """
+    if len(text) <= limit:
+        # Never more graphemes than code points, so nothing to cut
+        return text
+    if _GRAPHEME_RE is not None:
+        return ''.join(islice(_GRAPHEME_RE.findall(text[:limit * 8]), limit))
+    # Fallback: back the cut off any combining mark / zero-width joiner it would orphan
+    cut = limit
+    while cut > 0 and (unicodedata.combining(text[cut]) or text[cut] in '\u200d\ufe0f' or text[cut - 1] == '\u200d'):
+        cut -= 1
+    return text[:cut]
+
+def _fast_prefix_text(html_content: str) -> Optional[str]:
+    """
+    Tag-stripping regex pass over the head of the document. Returns the text if it
+    is long enough for a digest, or None so the caller falls through to a parser.
+    """
+    head = _NON_TEXT_BLOCK_RE.sub(' ', html_content[:DIGEST_FAST_PATH_CHARS])
+    if _UNCLOSED_NON_TEXT_RE.search(head):
+        # A style/script/comment block runs past the head; let the parser handle it
+        return None
+    if _QUOTED_GT_RE.search(head):
+        return None
+    # Drop a tag cut in half by the slice
+    last_open = head.rfind('<')
+    if last_open > head.rfind('>'):
+        head = head[:last_open]
+    text = _WHITESPACE_RE.sub(' ', html.unescape(_TAG_RE.sub(' ', head))).strip()
+    if len(text) < MAX_DIGEST_LENGTH + _FAST_PATH_MARGIN:
+        return None
+    return text
+
+def _extract_prefix_text(html_content: str, limit: int) -> str:
+    """Returns the article's visible text (whitespace collapsed), reading only until `limit` chars are found."""
+    collector = _DigestTextCollector(limit)
+    try:
+        collector.feed(html_content)
+        collector.close()
+    except _DigestComplete:
+        pass
+    return ' '.join(collector.parts)
+
+def _visible_text(element) -> Iterator[str]:
+    """Yields an lxml element's text in document order, skipping NON_TEXT_TAGS and comments."""
+    if not isinstance(element.tag, str) or element.tag in NON_TEXT_TAGS:
+        return
+    if element.text:
+        yield element.text
+    for child in element:
+        yield from _visible_text(child)
+        if child.tail:
+            yield child.tail
+
+def _extract_full_text(html_content: str) -> str:
+    """
+    Parser-based text extraction, used when the streaming collector fails. selectolax
+    extracts the full text; otherwise lxml's pull parser is fed the document in chunks
+    and stops once the closed elements hold MAX_DIGEST_LENGTH * 2 chars of text.
+    """
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html_content)
+        tree.strip_tags(list(NON_TEXT_TAGS))
+        return _WHITESPACE_RE.sub(' ', tree.text(separator=' ', strip=True)).strip()
+    # Imported here so payloads with author-supplied digests never load lxml
+    from lxml import etree
+    parser = etree.HTMLPullParser(events=('end',))
+    length = 0
+    for offset in range(0, len(html_content), PULL_PARSER_FEED_CHARS):
+        parser.feed(html_content[offset:offset + PULL_PARSER_FEED_CHARS])
+        for _, element in parser.read_events():
+            if element.tag not in NON_TEXT_TAGS and element.text:
+                length += len(element.text) # Tails aren't final yet; undercounting only feeds more
+        if length >= MAX_DIGEST_LENGTH * 2:
+            break
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError: # Empty input
+        return ""
+    if root is None: # Whitespace-only input
+        return ""
+    return _WHITESPACE_RE.sub(' ', ' '.join(_visible_text(root))).strip()
+
+def _digest_from_html(content_hash: bytes, html_content: str) -> str:
+    """
+    Extracts the digest text from HTML, memoized on content_hash (blake2b of the HTML)
+    alone, so the cache holds short digests rather than whole article bodies.
+    """
+    with _DIGEST_CACHE_LOCK:
+        digest = _DIGEST_CACHE.get(content_hash)
+        if digest is not None:
+            _DIGEST_CACHE.move_to_end(content_hash)
+            return digest
+    digest = _extract_digest(html_content)
+    with _DIGEST_CACHE_LOCK:
+        _DIGEST_CACHE[content_hash] = digest
+        if len(_DIGEST_CACHE) > DIGEST_CACHE_SIZE:
+            _DIGEST_CACHE.popitem(last=False)
+    return digest
+
+def _extract_digest(html_content: str) -> str:
+    """Extracts the digest text from HTML (fast path, then streaming, then full parse)."""
+    text_content = _fast_prefix_text(html_content)
+    if text_content is None:
+        try:
+            text_content = _extract_prefix_text(html_content, MAX_DIGEST_LENGTH)
+        except Exception as e:
+            # Fall back to a full parse if the streaming parser chokes on the markup
+            logger.warning("Streaming digest extraction failed (%s); falling back to a full parse.", e)
+            text_content = _extract_full_text(html_content)
+    return _truncate_graphemes(text_content, MAX_DIGEST_LENGTH).strip()
 
 def generate_digest(metadata: Dict[str, Any], html_content: str) -> str:
     """Generates a digest for the WeChat draft article."""
-    digest = metadata.get("digest", "").strip()
-
-    if not digest:
-        if html_content:
-            soup = BeautifulSoup(html_content, 'lxml')
-            text_content = soup.get_text(separator=' ', strip=True)
-            digest = text_content[:MAX_DIGEST_LENGTH].strip()
-            logger.debug(f"Digest generated from content: '{digest}'")
+    digest = metadata.get("digest")
+    if digest:
+        # Authored digest: return right away; the parse branches below stay cold
+        digest = digest.strip()
+        if len(digest) <= MAX_DIGEST_LENGTH:
+            if digest:
+                return digest
         else:
-            digest = "No summary provided."
-            logger.debug("No content available; using default digest.")
+            logger.warning("Digest length (%d) exceeds %d characters. Truncating.", len(digest), MAX_DIGEST_LENGTH)
+            return _truncate_graphemes(digest, MAX_DIGEST_LENGTH).rstrip()
 
-    if len(digest) > MAX_DIGEST_LENGTH:
-        logger.warning(f"Digest length ({len(digest)}) exceeds {MAX_DIGEST_LENGTH} characters. Truncating.")
-        digest = digest[:MAX_DIGEST_LENGTH].strip()
+    # Every branch below already yields at most MAX_DIGEST_LENGTH characters
+    if html_content and not html_content.isspace():
+        # Retries and preview + publish pass the same HTML; hash it so repeat calls are cache hits
+        content_hash = hashlib.blake2b(html_content.encode('utf-8', 'ignore'), digest_size=16).digest()
+        digest = _digest_from_html(content_hash, html_content)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Digest generated from content: %r", digest)
+    else:
+        digest = "No summary provided."
+        logger.debug("No content available; using default digest.")
 
     return digest
 
@@ -59,31 +266,40 @@ def build_draft_payload(metadata: Dict[str, Any], html_content: str, thumb_media
         Dictionary structured for WeChat draft API.
 
     Raises:
-        KeyError: If 'title' metadata is missing.
-        ValueError: If thumb_media_id is empty.
+        KeyError: If 'title' metadata is missing, empty or not a string.
+        ValueError: If thumb_media_id is empty or not a string.
     """
     logger.info("Building WeChat draft API payload...")
 
+    title = _validate_article(metadata, thumb_media_id)
+    digest = generate_digest(metadata, html_content)
+    article_data = _article_data(metadata, title, digest, html_content, thumb_media_id)
+
+    logger.info("WeChat draft payload successfully built.")
+
+    return article_data
+
+def _validate_article(metadata: Dict[str, Any], thumb_media_id: str) -> str:
+    """Checks the required article fields and returns the title."""
+    # isinstance first so non-str values never reach an arbitrary __bool__
     title = metadata.get("title")
-    if not title:
+    if not isinstance(title, str) or not title:
         raise KeyError("Required metadata 'title' is missing.")
 
-    if not thumb_media_id:
+    if not isinstance(thumb_media_id, str) or not thumb_media_id:
         raise ValueError("thumb_media_id cannot be empty.")
 
-    digest = generate_digest(metadata, html_content)
+    return title
 
+def _article_data(metadata: Dict[str, Any], title: str, digest: str, html_content: str, thumb_media_id: str) -> Dict[str, Any]:
+    """Assembles one article entry of the draft payload."""
     article_data = {
         "title": title,
-        "author": metadata.get("author", ""),
         "digest": digest,
         "content": html_content,
-        "content_source_url": metadata.get("content_source_url", ""),
         "thumb_media_id": thumb_media_id,
-        "need_open_comment": metadata.get("need_open_comment", 0),
-        "only_fans_can_comment": metadata.get("only_fans_can_comment", 0),
     }
+    for key, default in _ARTICLE_DEFAULTS:
+        article_data[key] = metadata.get(key, default)
+    return article_data
 
-    logger.info("WeChat draft payload successfully built.")
-
-    return article_data
\ No newline at end of file
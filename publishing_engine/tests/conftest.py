@@ -0,0 +1,20 @@
+# publishing_engine/tests/conftest.py
+
+import uuid
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """
+    Gives each test its own in-memory cache (LocMemCache), as publisher/tests does,
+    so tests that clear or fill the cache never touch the project's FileBasedCache
+    (which holds the permanent WeChat media IDs).
+    """
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'publishing-engine-test-cache-{uuid.uuid4()}',
+        }
+    }
@@ -4,13 +4,21 @@
 # (If you prefer keeping all tests in the Django app test dir)
 
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 # Import the functions to test
+from publishing_engine.core import payload_builder
 from publishing_engine.core.payload_builder import generate_digest, build_draft_payload, MAX_DIGEST_LENGTH
 
 # --- Tests for generate_digest ---
 
+@pytest.fixture(autouse=True)
+def clear_digest_cache():
+    """Digest extraction is memoized; start each test with an empty cache."""
+    payload_builder._DIGEST_CACHE.clear()
+    yield
+    payload_builder._DIGEST_CACHE.clear()
+
 def test_generate_digest_from_metadata():
     """Test digest generation when provided in metadata."""
     metadata = {"digest": "This is the exact digest."}
@@ -26,36 +34,113 @@ def test_generate_digest_from_metadata_truncation():
     expected_digest = "A" * MAX_DIGEST_LENGTH
     assert generate_digest(metadata, html_content) == expected_digest
 
-# Mock BeautifulSoup for tests relying on HTML parsing
-@patch('publishing_engine.core.payload_builder.BeautifulSoup')
-def test_generate_digest_from_html(mock_bs):
+def test_generate_digest_from_html():
     """Test digest generation from HTML content."""
-    mock_soup_instance = MagicMock()
-    # Configure the mock's get_text method
-    mock_soup_instance.get_text.return_value = "This is the plain text extracted from HTML content."
-    mock_bs.return_value = mock_soup_instance # Make BeautifulSoup() return our mock
-
     metadata = {} # No digest in metadata
-    html_content = "<p>This is the <b>HTML</b> content.</p>" # Actual HTML passed
-    expected_digest = "This is the plain text extracted from HTML content."[:MAX_DIGEST_LENGTH]
+    html_content = "<p>This is the <b>HTML</b> content.</p>"
+    assert generate_digest(metadata, html_content) == "This is the HTML content."
 
-    assert generate_digest(metadata, html_content) == expected_digest
-    mock_bs.assert_called_once_with(html_content, 'lxml')
-    mock_soup_instance.get_text.assert_called_once_with(separator=' ', strip=True)
+def test_generate_digest_from_html_skips_style_and_script():
+    """Embedded CSS/JS is not article text."""
+    html_content = '<style type="text/css">h2 { color: blue; }</style><div><h2>Title &amp; more</h2><script>var a;</script><p>Body\n text</p></div>'
+    assert generate_digest({}, html_content) == "Title & more Body text"
+
+def test_digest_memo_keyed_on_hash_only():
+    """Repeat HTML is a memo hit; the memo keeps the digest, not the article body."""
+    html_content = "<p>Memoized article body.</p>"
+    with patch.object(payload_builder, '_extract_digest', wraps=payload_builder._extract_digest) as extract:
+        assert generate_digest({}, html_content) == "Memoized article body."
+        assert generate_digest({}, html_content) == "Memoized article body."
+    extract.assert_called_once_with(html_content)
+    assert list(payload_builder._DIGEST_CACHE.values()) == ["Memoized article body."]
+    assert all(isinstance(key, bytes) for key in payload_builder._DIGEST_CACHE)
 
-@patch('publishing_engine.core.payload_builder.BeautifulSoup')
-def test_generate_digest_from_html_truncation(mock_bs):
+def test_digest_memo_bounded(monkeypatch):
+    monkeypatch.setattr(payload_builder, 'DIGEST_CACHE_SIZE', 2)
+    for i in range(3):
+        generate_digest({}, f"<p>Article {i}</p>")
+    assert list(payload_builder._DIGEST_CACHE.values()) == ["Article 1", "Article 2"]
+
+def test_generate_digest_from_html_truncation():
     """Test digest truncation when generated from long HTML content."""
     long_text = "B" * (MAX_DIGEST_LENGTH + 20)
-    mock_soup_instance = MagicMock()
-    mock_soup_instance.get_text.return_value = long_text
-    mock_bs.return_value = mock_soup_instance
-
     metadata = {}
     html_content = "<p>" + long_text + "</p>"
     expected_digest = "B" * MAX_DIGEST_LENGTH
     assert generate_digest(metadata, html_content) == expected_digest
 
+def test_generate_digest_stops_parsing_early():
+    """Only the head of a long article is parsed once the digest is full."""
+    # Tag-heavy head defeats the regex fast path, so the streaming parser runs
+    html_content = '<div class="wrapper">' * 200 + "<p>" + "word " * 20 + "</p>" + "<p>tail</p>" * 10000
+    with patch('publishing_engine.core.payload_builder._DigestTextCollector.handle_data', autospec=True,
+               side_effect=payload_builder._DigestTextCollector.handle_data) as mock_handle_data:
+        digest = generate_digest({}, html_content)
+    assert digest == ("word " * 20)[:MAX_DIGEST_LENGTH].strip()
+    assert mock_handle_data.call_count == 1
+
+def test_generate_digest_regex_fast_path():
+    """Text-rich heads are handled by the regex pass without invoking a parser."""
+    html_content = '<style>h1 { color: red; }</style><div><h1>Title &amp; Co</h1><!-- note --><p>' + "word " * 30 + "</p></div>"
+    with patch('publishing_engine.core.payload_builder._extract_prefix_text') as mock_extract:
+        digest = generate_digest({}, html_content)
+    mock_extract.assert_not_called()
+    assert digest == ("Title & Co " + "word " * 30)[:MAX_DIGEST_LENGTH].strip()
+
+def test_generate_digest_fast_path_defers_on_unclosed_style():
+    """A style block running past the scanned head is left to the parser."""
+    html_content = "<style>" + "p { color: red; }" * 200 + "</style><p>" + "word " * 30 + "</p>"
+    assert generate_digest({}, html_content) == ("word " * 30)[:MAX_DIGEST_LENGTH].strip()
+
+@pytest.mark.parametrize("tag", ['<p title="a>b">', "<p title='a>b'>", '<img alt="x > y" src="a.png"><p>'])
+def test_generate_digest_fast_path_defers_on_quoted_gt(tag: str):
+    """A '>' inside a quoted attribute value is left to the parser, not cut as the tag's end."""
+    html_content = tag + "word " * 30 + "</p>"
+    with patch('publishing_engine.core.payload_builder._extract_prefix_text', wraps=payload_builder._extract_prefix_text) as mock_extract:
+        digest = generate_digest({}, html_content)
+    mock_extract.assert_called_once()
+    assert digest == ("word " * 30)[:MAX_DIGEST_LENGTH].strip()
+
+def test_generate_digest_fast_path_keeps_quoted_attributes():
+    """Ordinary quoted attributes (and apostrophes in text) stay on the regex fast path."""
+    html_content = '<p class="lead"><a href="https://example.com/?a=1">It\'s</a> ' + "word " * 30 + "</p>"
+    with patch('publishing_engine.core.payload_builder._extract_prefix_text') as mock_extract:
+        digest = generate_digest({}, html_content)
+    mock_extract.assert_not_called()
+    assert digest == ("It's " + "word " * 30)[:MAX_DIGEST_LENGTH].strip()
+
+@pytest.mark.skipif(payload_builder.LexborHTMLParser is None, reason="selectolax not installed")
+@patch('publishing_engine.core.payload_builder._extract_prefix_text', side_effect=RuntimeError("boom"))
+def test_generate_digest_falls_back_to_selectolax(mock_extract):
+    """selectolax handles the full-parse fallback when installed."""
+    html_content = '<style>p { color: red; }</style><p>This is the <b>HTML</b>\n content.</p>'
+    assert generate_digest({}, html_content) == "This is the HTML content."
+
+@patch('publishing_engine.core.payload_builder._extract_prefix_text', side_effect=RuntimeError("boom"))
+@patch('publishing_engine.core.payload_builder.LexborHTMLParser', None)
+def test_generate_digest_falls_back_to_lxml_pull_parser(mock_extract):
+    """lxml's pull parser is used only when streaming extraction fails and selectolax is unavailable."""
+    html_content = '<style>p { color: red; }</style><p>This is the <b>HTML</b>\n content.</p><!-- note -->More text.'
+    assert generate_digest({}, html_content) == "This is the HTML content. More text."
+    assert payload_builder._extract_full_text("   ") == ""
+
+@patch('publishing_engine.core.payload_builder.LexborHTMLParser', None)
+def test_pull_parser_fallback_stops_early():
+    """The lxml fallback stops feeding the parser once there's enough text for the digest."""
+    html_content = "<style>p { color: red; }</style><p>" + "word " * 10 + "</p>" + "<p>paragraph</p>" * 5000
+    text = payload_builder._extract_full_text(html_content)
+    assert text.startswith(("word " * 10).strip())
+    assert "color" not in text
+    assert len(text) < len(html_content) // 10
+
+def test_generate_digest_cached_for_same_html():
+    """Repeat calls with the same HTML reuse the extracted digest."""
+    html_content = '<div class="wrapper">' * 200 + "<p>Cached digest text</p>"
+    with patch('publishing_engine.core.payload_builder._extract_prefix_text', return_value="Cached digest text") as mock_extract:
+        assert generate_digest({}, html_content) == "Cached digest text"
+        assert generate_digest({}, html_content) == "Cached digest text"
+    mock_extract.assert_called_once()
+
 def test_generate_digest_no_metadata_no_html():
     """Test digest generation when no metadata digest and no HTML are provided."""
     metadata = {}
@@ -63,6 +148,12 @@ def test_generate_digest_no_metadata_no_html():
     expected_digest = "No summary provided."
     assert generate_digest(metadata, html_content) == expected_digest
 
+@patch('publishing_engine.core.payload_builder._digest_from_html')
+def test_generate_digest_whitespace_html_skips_parsing(mock_digest_from_html):
+    """Whitespace-only HTML gets the default digest without hashing or parsing it."""
+    assert generate_digest({}, " \n\t ") == "No summary provided."
+    mock_digest_from_html.assert_not_called()
+
 # --- Tests for build_draft_payload ---
 
 @patch('publishing_engine.core.payload_builder.generate_digest')
@@ -136,4 +227,35 @@ def test_build_draft_payload_empty_thumb_id():
 
     thumb_media_id = None # None
     with pytest.raises(ValueError, match="thumb_media_id cannot be empty."):
-        build_draft_payload(metadata, html_content, thumb_media_id)
\ No newline at end of file
+        build_draft_payload(metadata, html_content, thumb_media_id)
+
+@pytest.mark.parametrize("title", [None, 123, ["A Title"]])
+def test_build_draft_payload_non_str_title(title):
+    """Only a non-empty string counts as a title."""
+    with pytest.raises(KeyError, match="Required metadata 'title' is missing."):
+        build_draft_payload({"title": title}, "<p>Content</p>", "PERM_ID_789")
+
+def test_build_draft_payload_non_str_thumb_id():
+    with pytest.raises(ValueError, match="thumb_media_id cannot be empty."):
+        build_draft_payload({"title": "A Title"}, "<p>Content</p>", 12345)
+
+@pytest.mark.parametrize("use_regex", [True, False])
+def test_generate_digest_truncation_keeps_graphemes_whole(use_regex: bool):
+    """Truncation never splits a base letter from its combining mark."""
+    grapheme_re = payload_builder._GRAPHEME_RE if use_regex else None
+    if use_regex and grapheme_re is None:
+        pytest.skip("regex not installed")
+    long_digest = "a" * (MAX_DIGEST_LENGTH - 1) + "e\u0301" + "z" * 5 # e + combining acute straddles the cut
+    with patch('publishing_engine.core.payload_builder._GRAPHEME_RE', grapheme_re):
+        digest = generate_digest({"digest": long_digest}, "")
+    assert digest in ("a" * (MAX_DIGEST_LENGTH - 1), "a" * (MAX_DIGEST_LENGTH - 1) + "e\u0301")
+
+def test_generate_digest_from_metadata_skips_html_parsing():
+    """An authored digest returns before any HTML work."""
+    with patch('publishing_engine.core.payload_builder._digest_from_html') as mock_digest_from_html:
+        assert generate_digest({"digest": "  Authored digest  "}, "<p>Body</p>") == "Authored digest"
+    mock_digest_from_html.assert_not_called()
+
+def test_generate_digest_whitespace_metadata_falls_back_to_html():
+    assert generate_digest({"digest": "   "}, "<p>Body text</p>") == "Body text"
+
@@ -0,0 +1,36 @@
+# publishing_engine/tests/utils/test_file_handler.py
+
+import os
+import pytest
+
+# Functions to test
+from publishing_engine.utils.file_handler import read_file, write_file
+
+def test_write_file_round_trip(tmp_path):
+    """Writes UTF-8 (incl. Chinese) content, creating parent dirs; overwrites are truncated."""
+    target = tmp_path / "nested" / "dir" / "article.html"
+    write_file(target, "<p>中文内容 and a much longer first version</p>")
+    write_file(target, "<p>中文</p>")
+    assert target.read_bytes() == "<p>中文</p>".encode('utf-8')
+    assert read_file(target) == "<p>中文</p>"
+
+def test_write_file_handles_partial_writes(tmp_path, mocker):
+    """os.write may write fewer bytes than asked; the remainder is still written."""
+    real_write = os.write
+    mocker.patch('publishing_engine.utils.file_handler.os.write', side_effect=lambda fd, data: real_write(fd, data[:3]))
+    target = tmp_path / "out.txt"
+    write_file(target, "abcdefgh")
+    assert target.read_text() == "abcdefgh"
+
+def test_write_file_without_posix_fadvise(tmp_path, monkeypatch):
+    """Platforms without posix_fadvise (macOS/Windows) still write normally."""
+    monkeypatch.delattr(os, 'posix_fadvise', raising=False)
+    target = tmp_path / "out.txt"
+    write_file(target, "content")
+    assert target.read_text() == "content"
+
+def test_write_file_error_wrapped(tmp_path):
+    """OS errors surface as RuntimeError, like read_file."""
+    (tmp_path / "blocker").write_text("not a directory")
+    with pytest.raises(RuntimeError, match="Failed to write to file"):
+        write_file(tmp_path / "blocker" / "out.txt", "content")
@@ -5,7 +5,8 @@ from pathlib import Path
 import hashlib
 
 # Function to test
-from publishing_engine.utils.hashing_checking import calculate_file_hash
+from publishing_engine.utils import hashing_checking
+from publishing_engine.utils.hashing_checking import calculate_file_digest, calculate_file_hash
 
 def test_calculate_file_hash_success(tmp_path):
     """Test calculating SHA-256 hash for an existing file."""
@@ -56,3 +57,85 @@ def test_calculate_file_hash_md5(tmp_path):
 
     assert actual_hash == expected_hash
 
+
+@pytest.mark.parametrize("use_file_digest", [True, False])
+def test_calculate_file_hash_backends(tmp_path, monkeypatch, use_file_digest: bool):
+    """hashlib.file_digest and the mmap fallback agree, including on empty files."""
+    if not use_file_digest:
+        monkeypatch.delattr(hashlib, 'file_digest', raising=False)
+    for name, content in [("data.bin", b"x" * 200_000), ("empty.bin", b"")]:
+        file_path = tmp_path / name
+        file_path.write_bytes(content)
+        assert calculate_file_hash(file_path) == hashlib.sha256(content).hexdigest()
+
+def test_calculate_file_hash_cached_until_file_changes(tmp_path, mocker):
+    """Repeat calls for an unchanged file reuse the digest; edits invalidate it."""
+    hashing_checking._hash_cached.cache_clear()
+    spy = mocker.spy(hashing_checking, '_hash_file')
+    file_path = tmp_path / "image.jpg"
+    file_path.write_bytes(b"version 1")
+
+    assert calculate_file_hash(file_path) == calculate_file_hash(file_path) == hashlib.sha256(b"version 1").hexdigest()
+    assert spy.call_count == 1
+
+    file_path.write_bytes(b"version 2, longer")
+    assert calculate_file_hash(file_path) == hashlib.sha256(b"version 2, longer").hexdigest()
+    assert spy.call_count == 2
+
+def test_calculate_file_hash_single_stat_on_cache_hit(tmp_path, mocker):
+    """A cached lookup costs one stat() and never reaches the hashing (open) path."""
+    hashing_checking._hash_cached.cache_clear()
+    file_path = tmp_path / "image.jpg"
+    file_path.write_bytes(b"content")
+    calculate_file_hash(file_path)
+
+    stat_spy = mocker.spy(Path, 'stat')
+    hash_spy = mocker.spy(hashing_checking, '_hash_file')
+    assert calculate_file_hash(file_path) == hashlib.sha256(b"content").hexdigest()
+    assert stat_spy.call_count == 1
+    assert hash_spy.call_count == 0
+
+def test_calculate_file_hash_readinto_fallback(tmp_path, monkeypatch):
+    """If mmap is unavailable, the readinto() fallback hashes correctly with a reused per-thread buffer."""
+    hashing_checking._hash_cached.cache_clear()
+    monkeypatch.delattr(hashlib, 'file_digest', raising=False)
+    def no_mmap(*args, **kwargs):
+        raise OSError("mmap not supported")
+    monkeypatch.setattr(hashing_checking.mmap, 'mmap', no_mmap)
+    content = b"0123456789" * 1000
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(content)
+
+    assert calculate_file_hash(file_path, buffer_size=4096) == hashlib.sha256(content).hexdigest()
+    buf = hashing_checking._read_buffer(4096)
+    (tmp_path / "other.bin").write_bytes(b"other")
+    assert calculate_file_hash(tmp_path / "other.bin", buffer_size=4096) == hashlib.sha256(b"other").hexdigest()
+    assert hashing_checking._read_buffer(4096) is buf
+
+@pytest.mark.skipif(hashing_checking.blake3 is None, reason="blake3 not installed")
+def test_calculate_file_hash_blake3(tmp_path):
+    """BLAKE3 fingerprints match the reference implementation."""
+    hashing_checking._hash_cached.cache_clear()
+    content = b"x" * 300_000
+    file_path = tmp_path / "cover.jpg"
+    file_path.write_bytes(content)
+    assert hashing_checking.FINGERPRINT_ALGORITHM == 'blake3'
+    assert calculate_file_hash(file_path, algorithm='blake3') == hashing_checking.blake3.blake3(content).hexdigest()
+
+def test_calculate_file_hash_blake3_unavailable(tmp_path, monkeypatch):
+    """Without the blake3 package, asking for 'blake3' is an error (logged; returns None)."""
+    hashing_checking._hash_cached.cache_clear()
+    monkeypatch.setattr(hashing_checking, 'blake3', None)
+    file_path = tmp_path / "cover.jpg"
+    file_path.write_bytes(b"content")
+    assert calculate_file_hash(file_path, algorithm='blake3') is None
+
+def test_calculate_file_digest_bytes(tmp_path):
+    """calculate_file_digest returns the raw digest; calculate_file_hash is its hex form."""
+    hashing_checking._hash_cached.cache_clear()
+    file_path = tmp_path / "image.jpg"
+    file_path.write_bytes(b"content")
+    digest = calculate_file_digest(file_path)
+    assert digest == hashlib.sha256(b"content").digest()
+    assert calculate_file_hash(file_path) == digest.hex()
+    assert calculate_file_digest(tmp_path / "missing.jpg") is None
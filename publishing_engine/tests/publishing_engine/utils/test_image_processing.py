@@ -0,0 +1,71 @@
+# publishing_engine/tests/utils/test_image_processing.py
+
+import io
+import os
+import pytest
+from pathlib import Path
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+
+# Function to test
+from publishing_engine.utils.image_processing import ensure_image_size
+
+def _noisy_jpeg(path: Path, size=(400, 400), quality: int = 95) -> Path:
+    """Writes a random-noise JPEG (compresses poorly, so quality matters)."""
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(path, format='JPEG', quality=quality)
+    return path
+
+def test_ensure_image_size_within_limit(tmp_path):
+    """Images already under the limit are returned untouched."""
+    img_path = _noisy_jpeg(tmp_path / "small.jpg", size=(16, 16))
+    assert ensure_image_size(img_path, size_limit_kb=1024) == img_path
+
+def test_ensure_image_size_not_found(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ensure_image_size(tmp_path / "missing.jpg", size_limit_kb=64)
+
+def test_ensure_image_size_directory_not_found(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ensure_image_size(tmp_path, size_limit_kb=64)
+
+def test_ensure_image_size_single_stat(tmp_path, mocker):
+    """The existence check and the size check share one stat() call."""
+    img_path = _noisy_jpeg(tmp_path / "small.jpg", size=(16, 16))
+    stat_spy = mocker.spy(Path, 'stat')
+    assert ensure_image_size(img_path, size_limit_kb=1024) == img_path
+    assert stat_spy.call_count == 1
+
+def test_ensure_image_size_jpeg_quality_binary_search(tmp_path, mocker):
+    """The highest fitting quality is found with ~log2(n) encodes and no re-encode for the final write."""
+    img_path = _noisy_jpeg(tmp_path / "photo.jpg")
+    sizes = {}
+    for q in range(85, 59, -5):
+        buffer = io.BytesIO()
+        Image.open(img_path).save(buffer, format='JPEG', quality=q, optimize=True)
+        sizes[q] = buffer.tell()
+    limit_kb = (sizes[70] + sizes[75]) // 2 // 1024 + 1 # Between quality 70 and 75 (75 shouldn't fit)
+    if sizes[75] <= limit_kb * 1024 or sizes[70] > limit_kb * 1024:
+        pytest.skip("Encoded sizes too close to bracket a single quality step")
+
+    save_spy = mocker.spy(Image.Image, 'save')
+    output_path = ensure_image_size(img_path, size_limit_kb=limit_kb)
+
+    assert output_path == tmp_path / "photo_optimized.jpg"
+    assert output_path.stat().st_size <= limit_kb * 1024
+    assert Image.open(output_path).size == (400, 400) # Quality alone was enough; no resize
+    assert save_spy.call_count <= 3 # 6 candidate qualities (85..60)
+
+def test_ensure_image_size_jpeg_resize_uses_draft_decode(tmp_path, mocker):
+    """When quality alone can't fit, JPEGs are re-decoded at a reduced DCT scale before resizing."""
+    img_path = _noisy_jpeg(tmp_path / "large.jpg", size=(1600, 1200))
+    draft_spy = mocker.spy(JpegImageFile, 'draft')
+
+    output_path = ensure_image_size(img_path, size_limit_kb=48)
+
+    assert output_path.stat().st_size <= 48 * 1024
+    draft_spy.assert_called_once()
+    draft_result = draft_spy.spy_return # (mode, (x0, y0, x1, y1) scale box) or None
+    assert draft_result is not None # libjpeg decoded at 1/2, 1/4 or 1/8 scale
+    width, height = Image.open(output_path).size
+    assert width < 1600 and height < 1200
+    assert abs(width / height - 1600 / 1200) < 0.02 # Aspect ratio preserved
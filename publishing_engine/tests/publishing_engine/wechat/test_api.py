@@ -1,205 +1,259 @@
 # tests/test_api.py (or publishing_engine/wechat/tests/test_api.py)
 
 import pytest
+import logging
+import re
+import socket
 import requests
 import json
+from django.core.cache import cache
 from pathlib import Path
-from unittest.mock import MagicMock # Can use MagicMock directly too
+from types import SimpleNamespace
 
 # Assuming your api module is importable like this:
 from publishing_engine.wechat import api
+from publishing_engine.wechat.api import _check_response, upload_content_image, upload_thumb_media, add_draft
+from publishing_engine.wechat.breaker import CircuitBreaker
+from publishing_engine.wechat.exceptions import WeChatAPIError, WeChatCircuitOpenError
+
+# --- Expected error messages (compiled once; pytest.raises accepts patterns) ---
+RE_NET_ERR = re.compile("Network error during API call")
+RE_TIMEOUT = re.compile("Request timed out")
+RE_INVALID = re.compile("Invalid response")
+RE_WECHAT = re.compile(r"WeChat API error .* 40001 - invalid credential")
+RE_WECHAT_FREQ = re.compile(r"WeChat API error .* 45009")
+RE_BAD_CONTENT_TYPE = re.compile("Invalid content image type")
+JPEG_MAGIC = b"\xff\xd8\xff\xe0\x00\x10JFIF"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR"
+WEBP_MAGIC = b"RIFF\x00\x00\x00\x00WEBPVP8 "
+RE_CONTENT_TOO_LARGE = re.compile("exceeds 1MB limit")
+RE_BAD_THUMB_TYPE = re.compile("Invalid thumbnail image type")
+RE_THUMB_TOO_LARGE = re.compile("exceeds 64KB limit")
+RE_BAD_ARTICLES = re.compile("must contain a non-empty 'articles' list")
+RE_JSON_FAIL = re.compile("Failed to prepare JSON payload")
+RE_NO_MEDIA = re.compile("WeChat API did not return 'media_id'")
 
 # --- Fixtures ---
 
-@pytest.fixture
-def mock_requests_session(mocker):
-    """Mocks requests.Session and its methods."""
-    mock_session_class = mocker.patch('requests.Session', autospec=True)
-    mock_session_instance = mock_session_class.return_value
-
-    # Mock prepare_request to return a mock prepared request
-    mock_prepared_request = MagicMock()
-    mock_prepared_request.headers = {} # Simulate headers dict
-    mock_prepared_request.body = b''   # Simulate body bytes
-    mock_session_instance.prepare_request.return_value = mock_prepared_request
-
-    # Mock the send method
-    mock_response = MagicMock(spec=requests.Response)
-    mock_response.request = MagicMock() # Mock request attribute for _check_response logging
-    mock_response.request.url = "http://mockurl/fake"
-    mock_session_instance.send.return_value = mock_response
-
-    # Make the mock prepared request available for assertions if needed
-    mock_session_instance._mock_prepared_request = mock_prepared_request
-
-    # Make the mock response available for configuration in tests
-    mock_session_instance._mock_response = mock_response
-
-    return mock_session_instance # Return the instance for configuration/assertions
+# api's shared requests.Session (api._SESSION) is replaced per test by a FakeSession.
+
+class FakeResponse:
+    """
+    Minimal stand-in for requests.Response: just what _check_response touches,
+    plus call counters. Much cheaper than MagicMock(spec=requests.Response).
+    """
+    __slots__ = ("json_data", "json_exc", "raise_exc", "text", "request", "status_code", "json_calls", "raise_for_status_calls")
+
+    def __init__(self, json_data=None, json_exc=None, raise_exc=None, text="", url="http://mockurl/fake", status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+        self.json_exc = json_exc
+        self.raise_exc = raise_exc
+        self.text = text
+        self.request = SimpleNamespace(url=url) # Request URL for _check_response logging
+        self.json_calls = 0
+        self.raise_for_status_calls = 0
+
+    def raise_for_status(self):
+        self.raise_for_status_calls += 1
+        if self.raise_exc:
+            raise self.raise_exc
+
+    def json(self):
+        self.json_calls += 1
+        if self.json_exc:
+            raise self.json_exc
+        return self.json_data
+
+class FakeSession:
+    """Stand-in for requests.Session with just the methods api uses; records what was sent."""
+
+    def __init__(self):
+        self.posts = [] # (args, kwargs) per post() call
+        self.closed = False
+        self.outcomes = [] # Queued responses/exceptions, consumed before _response
+        self._response = FakeResponse(url="http://mockurl/fake")
+
+    def _next(self):
+        outcome = self.outcomes.pop(0) if self.outcomes else self._response
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def post(self, *args, **kwargs):
+        self.posts.append((args, kwargs))
+        return self._next()
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture(autouse=True)
+def mock_requests_session(monkeypatch, locmem_cache):
+    """Replaces api's shared session with a fresh FakeSession (autouse: no test reaches the network)."""
+    fake = FakeSession()
+    monkeypatch.setattr(api, '_SESSION', fake)
+    monkeypatch.setattr(api, '_DRAFT_SESSION', fake)
+    monkeypatch.setattr(api.time, 'sleep', lambda seconds: None) # Retries back off instantly
+    cache.clear() # Circuit breaker state lives in the cache (conftest's LocMemCache)
+    monkeypatch.setattr(api, '_BREAKER', CircuitBreaker("api"))
+    yield fake # Return the instance for configuration/assertions
+    # The session is shared across calls; closing it would drop the pooled connection
+    assert not fake.closed, "api must not close the shared session"
 
 @pytest.fixture
-def mock_requests_post(mocker):
-    """Mocks requests.post."""
-    mock_post = mocker.patch('requests.post', autospec=True)
-    mock_response = MagicMock(spec=requests.Response)
-    mock_response.request = MagicMock()
-    mock_response.request.url = "http://mockurl/fake_post"
-    mock_post.return_value = mock_response
-    # Make response available for configuration
-    mock_post._mock_response = mock_response
-    return mock_post
+def sized_file(request, tmp_path) -> Path:
+    """
+    Creates tmp_path / request.param['name'] with st_size == request.param['size'].
+    It starts with the JPEG/PNG signature matching its suffix (uploads sniff it); the
+    rest is sparse (truncate), so large sizes cost no writes, and nothing on
+    Path is patched, which keeps these tests safe to run in parallel.
+    Use with @pytest.mark.parametrize('sized_file', [{'name': ..., 'size': ...}], indirect=True).
+    """
+    path = tmp_path / request.param['name']
+    with path.open('wb') as f:
+        f.write(PNG_MAGIC if path.suffix == '.png' else JPEG_MAGIC)
+        f.truncate(request.param['size'])
+    return path
 
 
 # --- Tests for _check_response ---
 
 def test_check_response_success():
     """Test _check_response with a successful response."""
-    mock_response = MagicMock(spec=requests.Response)
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.return_value = {"errcode": 0, "errmsg": "ok", "data": "success"}
-    mock_response.request = MagicMock()
-    mock_response.request.url = "http://success.com"
+    mock_response = FakeResponse(json_data={"errcode": 0, "errmsg": "ok", "data": "success"}, url="http://success.com")
 
-    result = api._check_response(mock_response)
+    result = _check_response(mock_response)
     assert result == {"errcode": 0, "errmsg": "ok", "data": "success"}
-    mock_response.raise_for_status.assert_called_once()
-    mock_response.json.assert_called_once()
-
-def test_check_response_http_error():
-    """Test _check_response with an HTTP error status."""
-    mock_response = MagicMock(spec=requests.Response)
-    mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("404 Client Error")
-    mock_response.request = MagicMock()
-    mock_response.request.url = "http://notfound.com"
-
-    with pytest.raises(RuntimeError, match="Network error during API call"):
-        api._check_response(mock_response)
-    mock_response.raise_for_status.assert_called_once()
-    mock_response.json.assert_not_called() # Should fail before json decode
-
-def test_check_response_timeout_error():
-    """Test _check_response with a Timeout error."""
-    mock_response = MagicMock(spec=requests.Response)
-    # Simulate timeout occurring during the request, caught by _check_response's caller
-    # For testing _check_response itself, simulate raise_for_status raising it
-    mock_response.raise_for_status.side_effect = requests.exceptions.Timeout("Timeout")
-    mock_response.request = MagicMock()
-    mock_response.request.url = "http://timeout.com"
-
-    # The function catches Timeout specifically after raise_for_status
-    with pytest.raises(RuntimeError, match="Request timed out"):
-         api._check_response(mock_response)
-
-def test_check_response_invalid_json():
-    """Test _check_response with invalid JSON in the response."""
-    mock_response = MagicMock(spec=requests.Response)
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.side_effect = json.JSONDecodeError("Expecting value", "<html>error</html>", 0)
-    mock_response.text = "<html>error</html>" # Provide text for error message
-    mock_response.request = MagicMock()
-    mock_response.request.url = "http://badjson.com"
-
-    with pytest.raises(RuntimeError, match="Invalid response"):
-        api._check_response(mock_response)
-    mock_response.raise_for_status.assert_called_once()
-    mock_response.json.assert_called_once()
-
-def test_check_response_wechat_api_error():
-    """Test _check_response with a WeChat API error code."""
-    mock_response = MagicMock(spec=requests.Response)
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.return_value = {"errcode": 40001, "errmsg": "invalid credential"}
-    mock_response.request = MagicMock()
-    mock_response.request.url = "http://wechat-error.com"
-
-    with pytest.raises(RuntimeError, match=r"WeChat API error .* 40001 - invalid credential"):
-        api._check_response(mock_response)
-    mock_response.raise_for_status.assert_called_once()
-    mock_response.json.assert_called_once()
+    assert mock_response.raise_for_status_calls == 1
+    assert mock_response.json_calls == 1
+
+# (raise_for_status side effect, json() result or exception, expected error pattern)
+CHECK_RESPONSE_ERROR_CASES = [
+    pytest.param(requests.exceptions.HTTPError("404 Client Error"), None, RE_NET_ERR, id="http"),
+    pytest.param(requests.exceptions.Timeout("Timeout"), None, RE_TIMEOUT, id="timeout"),
+    pytest.param(None, json.JSONDecodeError("Expecting value", "<html>error</html>", 0), RE_INVALID, id="json"),
+    pytest.param(None, {"errcode": 40001, "errmsg": "invalid credential"}, RE_WECHAT, id="wechat"),
+]
+
+@pytest.mark.parametrize("raise_error, json_result, match", CHECK_RESPONSE_ERROR_CASES)
+def test_check_response_errors(raise_error, json_result, match):
+    """_check_response turns HTTP, timeout, JSON and WeChat errcode failures into RuntimeError."""
+    mock_response = FakeResponse(
+        raise_exc=raise_error,
+        text="<html>error</html>", # Provide text for error message
+        url="http://error.com",
+    )
+    if isinstance(json_result, Exception):
+        mock_response.json_exc = json_result
+    else:
+        mock_response.json_data = json_result
+
+    with pytest.raises(RuntimeError, match=match):
+        _check_response(mock_response)
+    assert mock_response.raise_for_status_calls == 1
+    # Transport errors fail before the body is decoded
+    assert mock_response.json_calls == (0 if raise_error else 1)
 
 
 # --- Tests for upload_content_image ---
 
-def test_upload_content_image_success(tmp_path, mock_requests_post, mocker):
+@pytest.mark.parametrize('sized_file', [{'name': "test_content.jpg", 'size': len(b"dummy image data") * 10}], indirect=True)
+def test_upload_content_image_success(sized_file, mock_requests_session):
     """Test successful content image upload."""
-    # Setup: Create a dummy image file
-    img_path = tmp_path / "test_content.jpg"
-    img_path.write_bytes(b"dummy image data" * 10) # Small file < 1MB
+    # Setup: a dummy image file, small enough (< 1MB)
+    img_path = sized_file
     access_token = "CONTENT_TOKEN"
     base_url = "http://content.test.com"
     expected_url = f"{base_url}/cgi-bin/media/uploadimg"
     expected_wechat_url = "http://mmbiz.qpic.cn/sz_mmbiz_jpg/fake_url/0"
 
     # Configure mock response
-    mock_requests_post._mock_response.raise_for_status.return_value = None
-    mock_requests_post._mock_response.json.return_value = {"url": expected_wechat_url, "errcode": 0}
-
-    # Mock Path methods used before request
-    mocker.patch.object(Path, 'is_file', return_value=True)
-    mocker.patch.object(Path, 'stat', return_value=MagicMock(st_size=len(b"dummy image data")*10))
-    # Note: Path methods on img_path itself will work because tmp_path creates real files
+    mock_requests_session._response.json_data = {"url": expected_wechat_url, "errcode": 0}
 
     # Call function
-    result_url = api.upload_content_image(access_token, img_path, base_url=base_url)
+    result_url = upload_content_image(access_token, img_path, base_url=base_url)
 
     # Assertions
     assert result_url == expected_wechat_url
-    mock_requests_post.assert_called_once()
-    call_args, call_kwargs = mock_requests_post.call_args
+    assert len(mock_requests_session.posts) == 1
+    call_args, call_kwargs = mock_requests_session.posts[0]
     assert call_args[0] == expected_url
     assert call_kwargs['params'] == {"access_token": access_token}
     assert 'files' in call_kwargs
     # Add more assertions about file content if needed, though mocking open might be complex
 
+@pytest.mark.parametrize('sized_file', [{'name': "one_stat.jpg", 'size': 1024}], indirect=True)
+def test_upload_content_image_stats_once(sized_file, mock_requests_session, mocker):
+    """Existence and size validation share a single stat() call."""
+    mock_requests_session._response.json_data = {"url": "http://mmbiz/ok", "errcode": 0}
+    stat_spy = mocker.spy(Path, 'stat')
+    assert upload_content_image("TOKEN", sized_file) == "http://mmbiz/ok"
+    assert stat_spy.call_count == 1
+
+def test_upload_content_image_directory_rejected(tmp_path):
+    """A directory is not an uploadable image."""
+    dir_path = tmp_path / "images.jpg"
+    dir_path.mkdir()
+    with pytest.raises(FileNotFoundError, match="Content image not found"):
+        upload_content_image("TOKEN", dir_path)
+
 def test_upload_content_image_file_not_found(tmp_path):
     """Test content image upload when file doesn't exist."""
     non_existent_path = tmp_path / "not_real.jpg"
     with pytest.raises(FileNotFoundError):
-        api.upload_content_image("TOKEN", non_existent_path)
+        upload_content_image("TOKEN", non_existent_path)
 
 def test_upload_content_image_invalid_type(tmp_path):
     """Test content image upload with invalid file type."""
     img_path = tmp_path / "test_content.txt"
-    img_path.write_bytes(b"dummy text data")
-    with pytest.raises(ValueError, match="Invalid content image type"):
-        api.upload_content_image("TOKEN", img_path)
-
-def test_upload_content_image_too_large(tmp_path, mocker):
+    img_path.touch()
+    with pytest.raises(ValueError, match=RE_BAD_CONTENT_TYPE):
+        upload_content_image("TOKEN", img_path)
+
+def test_upload_content_image_sniffs_magic_bytes(tmp_path, mock_requests_session):
+    """The type comes from the file's bytes: WebP named .png is rejected before any upload,
+    and JPEG data named .png is sent as image/jpeg."""
+    webp_path = tmp_path / "actually_webp.png"
+    webp_path.write_bytes(WEBP_MAGIC + b"\x00" * 100)
+    with pytest.raises(ValueError, match=RE_BAD_CONTENT_TYPE):
+        upload_content_image("TOKEN", webp_path)
+    assert mock_requests_session.posts == []
+
+    mock_requests_session._response.json_data = {"url": "http://mmbiz/ok", "errcode": 0}
+    jpeg_path = tmp_path / "actually_jpeg.png"
+    jpeg_path.write_bytes(JPEG_MAGIC + b"\x00" * 100)
+    assert upload_content_image("TOKEN", jpeg_path) == "http://mmbiz/ok"
+    name, f, mime = mock_requests_session.posts[0][1]['files']['media']
+    assert (name, mime) == ("actually_jpeg.png", "image/jpeg")
+
+@pytest.mark.parametrize('sized_file', [{'name': "large_content.jpg", 'size': 2 * 1024 * 1024}], indirect=True) # > 1MB
+def test_upload_content_image_too_large(sized_file):
     """Test content image upload when file is too large."""
-    img_path = tmp_path / "large_content.jpg"
-    # Mock stat to return size > 1MB
-    mocker.patch.object(Path, 'is_file', return_value=True)
-    mocker.patch.object(Path, 'stat', return_value=MagicMock(st_size=2 * 1024 * 1024))
-    # mocker.patch.object(Path, 'suffix', '.jpg') # Not needed if using tmp_path actual file
+    img_path = sized_file
 
-    with pytest.raises(ValueError, match="exceeds 1MB limit"):
-        api.upload_content_image("TOKEN", img_path)
+    with pytest.raises(ValueError, match=RE_CONTENT_TOO_LARGE):
+        upload_content_image("TOKEN", img_path)
 
 
 # --- Tests for upload_thumb_media ---
 
-def test_upload_thumb_media_success(tmp_path, mock_requests_post, mocker):
+@pytest.mark.parametrize('sized_file', [{'name': "test_thumb.jpg", 'size': len(b"dummy thumb data") * 5}], indirect=True) # < 64KB
+def test_upload_thumb_media_success(sized_file, mock_requests_session):
     """Test successful thumb media upload."""
-    thumb_path = tmp_path / "test_thumb.jpg"
-    thumb_path.write_bytes(b"dummy thumb data" * 5) # Small file < 64KB
+    thumb_path = sized_file
     access_token = "THUMB_TOKEN"
     base_url = "http://thumb.test.com"
     expected_url = f"{base_url}/cgi-bin/material/add_material"
     expected_media_id = "THUMB_MEDIA_ID_XYZ"
 
     # Configure mock response
-    mock_requests_post._mock_response.raise_for_status.return_value = None
-    mock_requests_post._mock_response.json.return_value = {"media_id": expected_media_id, "errcode": 0}
-
-    # Mock Path methods if needed (like content image test)
-    mocker.patch.object(Path, 'is_file', return_value=True)
-    mocker.patch.object(Path, 'stat', return_value=MagicMock(st_size=len(b"dummy thumb data")*5))
+    mock_requests_session._response.json_data = {"media_id": expected_media_id, "errcode": 0}
 
-    result_id = api.upload_thumb_media(access_token, thumb_path, base_url=base_url)
+    result_id = upload_thumb_media(access_token, thumb_path, base_url=base_url)
 
     assert result_id == expected_media_id
-    mock_requests_post.assert_called_once()
-    call_args, call_kwargs = mock_requests_post.call_args
+    assert len(mock_requests_session.posts) == 1
+    call_args, call_kwargs = mock_requests_session.posts[0]
     assert call_args[0] == expected_url
     assert call_kwargs['params'] == {"access_token": access_token, "type": "thumb"}
     assert 'files' in call_kwargs
@@ -207,68 +261,77 @@ def test_upload_thumb_media_success(tmp_path, mock_requests_post, mocker):
 def test_upload_thumb_media_invalid_type(tmp_path):
     """Test thumb media upload with invalid file type (e.g., png)."""
     thumb_path = tmp_path / "test_thumb.png"
-    thumb_path.write_bytes(b"dummy png data")
-    with pytest.raises(ValueError, match="Invalid thumbnail image type"):
-        api.upload_thumb_media("TOKEN", thumb_path)
-
-def test_upload_thumb_media_too_large(tmp_path, mocker):
+    thumb_path.touch()
+    with pytest.raises(ValueError, match=RE_BAD_THUMB_TYPE):
+        upload_thumb_media("TOKEN", thumb_path)
+
+def test_upload_thumb_media_rejects_png_data_named_jpg(tmp_path, mock_requests_session):
+    """Thumbs must be JPEG data whatever the extension says."""
+    thumb_path = tmp_path / "thumb.jpg"
+    thumb_path.write_bytes(PNG_MAGIC + b"\x00" * 100)
+    with pytest.raises(ValueError, match=RE_BAD_THUMB_TYPE):
+        upload_thumb_media("TOKEN", thumb_path)
+    assert mock_requests_session.posts == []
+
+@pytest.mark.parametrize('sized_file', [{'name': "large_thumb.jpg", 'size': 70 * 1024}], indirect=True) # > 64KB
+def test_upload_thumb_media_too_large(sized_file):
     """Test thumb media upload when file is too large."""
-    thumb_path = tmp_path / "large_thumb.jpg"
-    mocker.patch.object(Path, 'is_file', return_value=True)
-    mocker.patch.object(Path, 'stat', return_value=MagicMock(st_size=70 * 1024)) # > 64KB
-    # mocker.patch.object(Path, 'suffix', '.jpg') # Not needed if using tmp_path actual file
+    thumb_path = sized_file
 
-    with pytest.raises(ValueError, match="exceeds 64KB limit"):
-        api.upload_thumb_media("TOKEN", thumb_path)
+    with pytest.raises(ValueError, match=RE_THUMB_TOO_LARGE):
+        upload_thumb_media("TOKEN", thumb_path)
 
 
 # --- Tests for add_draft ---
 
-@pytest.fixture
+# Built once; no test mutates it. (A MappingProxyType can't be passed through json.dumps.)
+_DRAFT_PAYLOAD_CHINESE = {
+    "articles": [
+        {
+            "title": "逻辑与世界", # Chinese Title
+            "author": "测试作者",
+            "digest": "重视逻辑，重获自由", # Chinese Digest
+            "content": "<p>一些内容 Content.</p>",
+            "content_source_url": "http://example.com/source",
+            "thumb_media_id": "DUMMY_THUMB_ID_123",
+            "need_open_comment": 0,
+            "only_fans_can_comment": 0
+        }
+    ]
+}
+# The body add_draft should send for it: UTF-8 JSON without \u escapes
+EXPECTED_BODY_BYTES = json.dumps(_DRAFT_PAYLOAD_CHINESE, ensure_ascii=False).encode('utf-8')
+TITLE_BYTES = "逻辑与世界".encode('utf-8')
+DIGEST_BYTES = "重视逻辑，重获自由".encode('utf-8')
+
+@pytest.fixture(scope="session")
 def draft_payload_chinese():
     """Provides a sample draft payload with Chinese characters."""
-    return {
-        "articles": [
-            {
-                "title": "逻辑与世界", # Chinese Title
-                "author": "测试作者",
-                "digest": "重视逻辑，重获自由", # Chinese Digest
-                "content": "<p>一些内容 Content.</p>",
-                "content_source_url": "http://example.com/source",
-                "thumb_media_id": "DUMMY_THUMB_ID_123",
-                "need_open_comment": 0,
-                "only_fans_can_comment": 0
-            }
-        ]
-    }
-
-def test_add_draft_success_manual_encoding(mock_requests_session, mocker, draft_payload_chinese):
-    """Test successful draft creation using manual encoding."""
+    return _DRAFT_PAYLOAD_CHINESE
+
+def test_add_draft_success_manual_encoding(mock_requests_session, mocker, monkeypatch, draft_payload_chinese):
+    """Test successful draft creation using manual encoding (stdlib json path)."""
+    monkeypatch.setattr(api, 'orjson', None)
     access_token = "DRAFT_TOKEN_123"
     base_url = "http://draft.test.com"
     expected_media_id = "DRAFT_MEDIA_ID_456"
     expected_url = f"{base_url}/cgi-bin/draft/add"
 
     # Configure the mock response via the session mock
-    mock_response = mock_requests_session._mock_response
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.return_value = {"media_id": expected_media_id, "errcode": 0}
-
-    # Mock requests.Request to capture arguments
-    mock_request_class = mocker.patch('requests.Request', autospec=True)
+    mock_response = mock_requests_session._response
+    mock_response.json_data = {"media_id": expected_media_id, "errcode": 0}
 
     # Call the function
-    result_media_id = api.add_draft(access_token, draft_payload_chinese, base_url=base_url)
+    result_media_id = add_draft(access_token, draft_payload_chinese, base_url=base_url)
 
     # Assertions
     assert result_media_id == expected_media_id
 
-    # Check that requests.Request was called correctly
-    mock_request_class.assert_called_once()
-    call_args, call_kwargs = mock_request_class.call_args
+    # Check the post on the shared session (which stays open)
+    assert len(mock_requests_session.posts) == 1
+    call_args, call_kwargs = mock_requests_session.posts[0]
 
-    assert call_args[0] == "POST"
-    assert call_args[1] == expected_url
+    assert call_args[0] == expected_url
     assert call_kwargs.get('params') == {"access_token": access_token}
     assert call_kwargs.get('headers') == {'Content-Type': 'application/json; charset=utf-8'}
     assert 'json' not in call_kwargs # Ensure json= parameter was NOT used
@@ -277,63 +340,220 @@ def test_add_draft_success_manual_encoding(mock_requests_session, mocker, draft_
     sent_data_bytes = call_kwargs.get('data')
     assert isinstance(sent_data_bytes, bytes)
 
-    # Decode and check content
-    decoded_body = sent_data_bytes.decode('utf-8')
-    assert "逻辑与世界" in decoded_body # Check for actual Chinese chars
-    assert "重视逻辑，重获自由" in decoded_body
-    assert "\\u" not in decoded_body   # Ensure no escapes remain
-
-    # Check structure after decoding
-    sent_payload = json.loads(decoded_body)
-    assert sent_payload == draft_payload_chinese
-
-    # Check that session.send was called
-    mock_requests_session.send.assert_called_once()
-    # Check session closed
-    mock_requests_session.close.assert_called_once()
-
-
-def test_add_draft_missing_articles():
-    """Test add_draft with payload missing 'articles' key."""
-    payload = {"no_articles": "here"}
-    # --- CORRECTED MATCH PATTERN ---
-    with pytest.raises(ValueError, match="must contain a non-empty 'articles' list"):
-        api.add_draft("TOKEN", payload)
-
-def test_add_draft_articles_not_list():
-    """Test add_draft with 'articles' not being a list."""
-    payload = {"articles": "not a list"}
-    # --- CORRECTED MATCH PATTERN ---
-    with pytest.raises(ValueError, match="must contain a non-empty 'articles' list"):
-        api.add_draft("TOKEN", payload)
-
-def test_add_draft_articles_empty_list():
-    """Test add_draft with 'articles' being an empty list."""
-    payload = {"articles": []}
-    # This test uses the correct message already
-    with pytest.raises(ValueError, match="must contain a non-empty 'articles' list"):
-        api.add_draft("TOKEN", payload)
-
-def test_add_draft_json_dumps_error(mocker, draft_payload_chinese):
+    # Check content directly on the bytes (no decode pass)
+    assert TITLE_BYTES in sent_data_bytes # Check for actual Chinese chars
+    assert DIGEST_BYTES in sent_data_bytes
+    assert b"\\u" not in sent_data_bytes   # Ensure no escapes remain
+
+    # Check the exact body (structure and encoding) with a single bytes compare;
+    # only on mismatch re-parse it, so pytest shows a readable structural diff
+    if sent_data_bytes != EXPECTED_BODY_BYTES:
+        assert json.loads(sent_data_bytes) == draft_payload_chinese
+        assert sent_data_bytes == EXPECTED_BODY_BYTES
+
+
+@pytest.mark.parametrize("payload", [
+    pytest.param({"no_articles": "here"}, id="missing_articles"),
+    pytest.param({"articles": "not a list"}, id="articles_not_list"),
+    pytest.param({"articles": []}, id="articles_empty_list"),
+])
+def test_add_draft_rejects_bad_payload(payload):
+    """add_draft requires a non-empty 'articles' list before making any request."""
+    with pytest.raises(ValueError, match=RE_BAD_ARTICLES):
+        add_draft("TOKEN", payload)
+
+@pytest.mark.parametrize("field, value, match", [
+    pytest.param("title", None, r"articles\[0\]\.title", id="missing_title"),
+    pytest.param("content", "", r"articles\[0\]\.content", id="empty_content"),
+    pytest.param("thumb_media_id", 123, r"articles\[0\]\.thumb_media_id", id="non_string_thumb"),
+])
+def test_add_draft_rejects_incomplete_article(mock_requests_session, field, value, match):
+    """Articles missing a required field fail locally, naming the field, without calling WeChat."""
+    article = dict(_DRAFT_PAYLOAD_CHINESE["articles"][0])
+    if value is None:
+        del article[field]
+    else:
+        article[field] = value
+    with pytest.raises(ValueError, match=match):
+        add_draft("TOKEN", {"articles": [article]})
+    assert mock_requests_session.posts == []
+
+def test_add_draft_json_dumps_error(mocker, monkeypatch, draft_payload_chinese):
     """Test add_draft when json.dumps fails."""
+    monkeypatch.setattr(api, 'orjson', None)
     mocker.patch('json.dumps', side_effect=TypeError("Cannot serialize"))
-    with pytest.raises(ValueError, match="Failed to prepare JSON payload"):
-        api.add_draft("TOKEN", draft_payload_chinese)
+    with pytest.raises(ValueError, match=RE_JSON_FAIL):
+        add_draft("TOKEN", draft_payload_chinese)
+
+@pytest.mark.skipif(api.orjson is None, reason="orjson not installed")
+def test_add_draft_orjson_encoding(mock_requests_session, mocker, draft_payload_chinese):
+    """With orjson the body is the same JSON, UTF-8 and unescaped, without touching json.dumps."""
+    mock_requests_session._response.json_data = {"media_id": "DRAFT_OK", "errcode": 0}
+    mock_dumps = mocker.patch('json.dumps')
+    assert add_draft("TOKEN", draft_payload_chinese) == "DRAFT_OK"
+    mock_dumps.assert_not_called()
+    sent_data_bytes = mock_requests_session.posts[0][1]['data']
+    assert TITLE_BYTES in sent_data_bytes
+    assert b"\\u" not in sent_data_bytes
+    assert json.loads(sent_data_bytes) == draft_payload_chinese
+
+@pytest.mark.skipif(api.orjson is None, reason="orjson not installed")
+def test_add_draft_orjson_error():
+    """Unserializable payloads fail the same way with orjson."""
+    with pytest.raises(ValueError, match=RE_JSON_FAIL):
+        add_draft("TOKEN", {"articles": [{**_DRAFT_PAYLOAD_CHINESE["articles"][0], "need_open_comment": object()}]})
 
 def test_add_draft_api_error(mock_requests_session, draft_payload_chinese):
     """Test add_draft when the API call returns a WeChat error."""
-    mock_response = mock_requests_session._mock_response
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.return_value = {"errcode": 45009, "errmsg": "api freq out of limit"}
+    mock_response = mock_requests_session._response
+    mock_response.json_data = {"errcode": 45009, "errmsg": "api freq out of limit"}
 
-    with pytest.raises(RuntimeError, match=r"WeChat API error .* 45009"):
-        api.add_draft("TOKEN", draft_payload_chinese)
+    with pytest.raises(RuntimeError, match=RE_WECHAT_FREQ):
+        add_draft("TOKEN", draft_payload_chinese)
 
 def test_add_draft_missing_media_id(mock_requests_session, draft_payload_chinese):
     """Test add_draft when the API response is successful but missing media_id."""
-    mock_response = mock_requests_session._mock_response
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.return_value = {"errcode": 0, "errmsg": "ok"} # Missing media_id
-
-    with pytest.raises(RuntimeError, match="WeChat API did not return 'media_id'"):
-        api.add_draft("TOKEN", draft_payload_chinese)
\ No newline at end of file
+    mock_response = mock_requests_session._response
+    mock_response.json_data = {"errcode": 0, "errmsg": "ok"} # Missing media_id
+
+    with pytest.raises(RuntimeError, match=RE_NO_MEDIA):
+        add_draft("TOKEN", draft_payload_chinese)
+
+def test_add_draft_preserialized_bytes(mock_requests_session, mocker, draft_payload_chinese):
+    """Pre-serialized UTF-8 JSON bytes are sent as-is, without re-encoding."""
+    mock_response = mock_requests_session._response
+    mock_response.json_data = {"media_id": "DRAFT_MEDIA_ID_789", "errcode": 0}
+    mock_dumps = mocker.patch('json.dumps')
+
+    assert add_draft("TOKEN", EXPECTED_BODY_BYTES) == "DRAFT_MEDIA_ID_789"
+    mock_dumps.assert_not_called()
+    assert mock_requests_session.posts[0][1].get('data') == EXPECTED_BODY_BYTES
+
+def test_add_draft_skips_body_decode_without_debug(mock_requests_session, draft_payload_chinese, caplog):
+    """The body is only decoded for logging when DEBUG is enabled."""
+    mock_requests_session._response.json_data = {"media_id": "DRAFT_OK", "errcode": 0}
+    caplog.set_level(logging.INFO, logger=api.logger.name)
+    add_draft("TOKEN", draft_payload_chinese)
+    assert "Decoded for log" not in caplog.text
+
+    caplog.set_level(logging.DEBUG, logger=api.logger.name)
+    add_draft("TOKEN", draft_payload_chinese)
+    assert "Decoded for log" in caplog.text
+
+def test_shared_session_configuration():
+    """The module session pools HTTPS connections and sets the User-Agent once."""
+    session = api._new_session()
+    adapter = session.get_adapter("https://api.weixin.qq.com")
+    assert adapter._pool_maxsize == api.POOL_MAXSIZE
+    assert adapter._pool_block is False
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in adapter.poolmanager.connection_pool_kw['socket_options']
+    assert adapter.max_retries.total == api.MAX_RETRIES
+    assert session.headers["User-Agent"] == api.USER_AGENT
+
+def test_session_replaced_after_fork(monkeypatch):
+    """A forked child gets its own session instead of the parent's pooled sockets."""
+    parent_session = object()
+    monkeypatch.setattr(api, '_SESSION', parent_session)
+    monkeypatch.setattr(api, '_DRAFT_SESSION', parent_session)
+    api._reset_session_after_fork()
+    assert api._SESSION is not parent_session
+    assert isinstance(api._SESSION, requests.Session)
+    assert isinstance(api._DRAFT_SESSION, requests.Session)
+
+
+# --- Tests for retries (_send_with_retry) ---
+
+def _ok(json_data):
+    return FakeResponse(json_data=json_data)
+
+# Transport errors and HTTP statuses are retried by urllib3 (api._transport_retry)
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_upload_transport_retry_statuses(status):
+    """Uploads retry 429/5xx (GET and POST) and honour Retry-After."""
+    retry = api._transport_retry(idempotent=True)
+    assert retry.is_retry("POST", status)
+    assert retry.is_retry("GET", status)
+    assert retry.respect_retry_after_header
+    assert not retry.raise_on_status # The final response still reaches _check_response
+    assert (retry.connect, retry.read) == (api.MAX_RETRIES, api.MAX_RETRIES)
+
+def test_draft_transport_retry_is_conservative():
+    """Creating a draft isn't idempotent: no read retries, and only statuses meaning 'not processed'."""
+    retry = api._new_session(idempotent=False).get_adapter("https://api.weixin.qq.com").max_retries
+    assert retry.read == 0
+    assert retry.connect == api.MAX_RETRIES
+    assert retry.is_retry("POST", 503) and retry.is_retry("POST", 429)
+    assert not retry.is_retry("POST", 500)
+    assert not retry.is_retry("POST", 502)
+
+def test_upload_transport_backoff_is_capped():
+    """urllib3 backoff grows exponentially from RETRY_BASE_DELAY up to RETRY_MAX_DELAY."""
+    retry = api._transport_retry(idempotent=True)
+    assert retry.backoff_factor == api.RETRY_BASE_DELAY
+    assert retry.backoff_max == api.RETRY_MAX_DELAY
+
+@pytest.mark.parametrize('sized_file', [{'name': "retry.jpg", 'size': 1024}], indirect=True)
+def test_upload_content_image_retries_busy_errcode(sized_file, mock_requests_session):
+    """WeChat 'busy' errcodes arrive in a 200 JSON body, so they are retried in Python."""
+    mock_requests_session.outcomes = [
+        FakeResponse(json_data={"errcode": -1, "errmsg": "system error"}),
+        _ok({"url": "http://mmbiz/ok", "errcode": 0}),
+    ]
+    assert upload_content_image("TOKEN", sized_file) == "http://mmbiz/ok"
+    assert len(mock_requests_session.posts) == 2
+
+@pytest.mark.parametrize('sized_file', [{'name': "retry.jpg", 'size': 1024}], indirect=True)
+def test_upload_retries_are_bounded(sized_file, mock_requests_session, monkeypatch):
+    """After MAX_RETRIES retries the failure is raised; backoff grows exponentially and is capped."""
+    delays = []
+    monkeypatch.setattr(api.time, 'sleep', delays.append)
+    monkeypatch.setattr(api.random, 'random', lambda: 0.0) # No jitter
+    mock_requests_session.outcomes = [_ok({"errcode": 45011, "errmsg": "api freq out of limit"}) for _ in range(api.MAX_RETRIES + 1)]
+
+    with pytest.raises(WeChatAPIError, match="45011"):
+        upload_content_image("TOKEN", sized_file)
+    assert len(mock_requests_session.posts) == api.MAX_RETRIES + 1
+    assert delays == [min(api.RETRY_MAX_DELAY, api.RETRY_BASE_DELAY * 2 ** i) for i in range(api.MAX_RETRIES)]
+
+def test_add_draft_transport_error_not_resent(mock_requests_session, draft_payload_chinese):
+    """Whatever urllib3 gives up on reaches the caller once; add_draft never resends it itself."""
+    mock_requests_session.outcomes = [requests.exceptions.ReadTimeout("slow")]
+    with pytest.raises(RuntimeError, match="Failed to add draft"):
+        add_draft("TOKEN", draft_payload_chinese)
+    assert len(mock_requests_session.posts) == 1
+
+@pytest.mark.parametrize('sized_file', [{'name': "retry.jpg", 'size': 1024}], indirect=True)
+def test_invalid_token_invalidates_cache_without_retry(sized_file, mock_requests_session, mocker):
+    """errcode 40001 drops the cached access token and is raised immediately."""
+    invalidate = mocker.patch.object(api.auth, 'invalidate_access_token')
+    mock_requests_session.outcomes = [_ok({"errcode": 40001, "errmsg": "invalid credential"})]
+
+    with pytest.raises(WeChatAPIError) as excinfo:
+        upload_thumb_media("TOKEN", sized_file)
+    assert excinfo.value.errcode == 40001
+    invalidate.assert_called_once_with()
+    assert len(mock_requests_session.posts) == 1
+
+@pytest.mark.parametrize('sized_file', [{'name': "breaker.jpg", 'size': 1024}], indirect=True)
+def test_circuit_opens_after_repeated_failures(sized_file, mock_requests_session):
+    """After the failure threshold, uploads fail fast without reaching the session."""
+    mock_requests_session.outcomes = [FakeResponse(status_code=503)] * api._BREAKER.failure_threshold
+    for _ in range(api._BREAKER.failure_threshold):
+        with pytest.raises(RuntimeError):
+            upload_content_image("TOKEN", sized_file)
+    assert len(mock_requests_session.posts) == api._BREAKER.failure_threshold
+
+    with pytest.raises(WeChatCircuitOpenError):
+        upload_content_image("TOKEN", sized_file)
+    assert len(mock_requests_session.posts) == api._BREAKER.failure_threshold
+
+@pytest.mark.parametrize('sized_file', [{'name': "breaker.jpg", 'size': 1024}], indirect=True)
+def test_wechat_errcode_does_not_trip_circuit(sized_file, mock_requests_session):
+    """A 200 with an errcode means WeChat is up, so it resets the failure count."""
+    mock_requests_session.outcomes = [requests.exceptions.ConnectionError("down")] * 4 + [_ok({"errcode": 40007, "errmsg": "invalid media_id"})]
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            upload_content_image("TOKEN", sized_file)
+    mock_requests_session._response.json_data = {"url": "http://mmbiz/ok", "errcode": 0}
+    assert upload_content_image("TOKEN", sized_file) == "http://mmbiz/ok"
@@ -0,0 +1,199 @@
+# publishing_engine/tests/publishing_engine/wechat/test_auth.py
+
+import json
+import threading
+import time
+
+import pytest
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from publishing_engine.wechat import auth
+from publishing_engine.wechat.auth import get_access_token, invalidate_access_token
+
+CACHE_KEY = f"{auth.TOKEN_CACHE_KEY_PREFIX}APPID"
+_use_token_file = auth._use_token_file # Unpatched, for the detection tests
+
+
+class FakeResponse:
+    def __init__(self, json_data):
+        self.json_data = json_data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.json_data
+
+
+class FakeSession:
+    """Stand-in for auth's shared session; counts token fetches."""
+
+    def __init__(self, delay=0.0):
+        self.gets = 0
+        self.delay = delay
+        self.json_data = None
+
+    def get(self, url, params=None, timeout=None):
+        self.gets += 1
+        time.sleep(self.delay) # Widen the race window for concurrency tests
+        return FakeResponse(self.json_data or {"access_token": f"TOKEN_{self.gets}", "expires_in": 7200})
+
+
+@pytest.fixture(autouse=True)
+def fake_session(monkeypatch, locmem_cache):
+    """Replaces the token session and starts every test with an empty (conftest LocMemCache) cache."""
+    cache.clear()
+    auth._token_cache_keys.clear()
+    auth._token_files.clear()
+    session = FakeSession()
+    monkeypatch.setattr(auth, '_SESSION', session)
+    monkeypatch.setattr(auth, '_use_token_file', lambda: False) # Exercise the Django cache path by default
+    yield session
+    cache.clear()
+
+
+def test_get_access_token_cached(fake_session):
+    """The token is stored in Django's cache and reused until close to expiry."""
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    assert fake_session.gets == 1
+    token, expires_at = cache.get(CACHE_KEY)
+    assert token == "TOKEN_1"
+    assert expires_at > time.time() + auth.TOKEN_EXPIRY_BUFFER
+
+def test_get_access_token_refetches_near_expiry(fake_session):
+    """A token inside the expiry buffer is treated as expired."""
+    cache.set(CACHE_KEY, ("OLD", time.time() + auth.TOKEN_EXPIRY_BUFFER - 1))
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+
+def test_get_access_token_concurrent_threads_fetch_once(fake_session):
+    """Threads racing on an empty cache coalesce into a single token request."""
+    fake_session.delay = 0.05
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_access_token("APPID", "SECRET"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["TOKEN_1"] * 8
+    assert fake_session.gets == 1
+
+def test_get_access_token_waits_for_other_process(fake_session):
+    """While another process holds the fetch lock, its token is awaited instead of fetched again."""
+    cache.add(f"{CACHE_KEY}_lock", 12345, timeout=auth.TOKEN_LOCK_TIMEOUT)
+    timer = threading.Timer(0.1, lambda: cache.set(CACHE_KEY, ("OTHER", time.time() + 7200)))
+    timer.start()
+    try:
+        assert get_access_token("APPID", "SECRET") == "OTHER"
+    finally:
+        timer.join()
+    assert fake_session.gets == 0
+
+def test_get_access_token_stale_lock_times_out(fake_session, monkeypatch):
+    """A lock left behind by a dead process only delays the fetch by TOKEN_LOCK_TIMEOUT."""
+    monkeypatch.setattr(auth, 'TOKEN_LOCK_TIMEOUT', 0.1)
+    monkeypatch.setattr(auth, 'TOKEN_LOCK_POLL_INTERVAL', 0.02)
+    cache.add(f"{CACHE_KEY}_lock", 12345, timeout=60)
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    assert fake_session.gets == 1
+
+def test_get_access_token_releases_lock_on_error(fake_session):
+    """A failed fetch raises and leaves the lock free for the next attempt."""
+    fake_session.json_data = {"errcode": 40013, "errmsg": "invalid appid"}
+    with pytest.raises(RuntimeError, match="invalid appid"):
+        get_access_token("APPID", "SECRET")
+    assert cache.get(f"{CACHE_KEY}_lock") is None
+    assert cache.get(CACHE_KEY) is None
+
+def test_invalidate_access_token(fake_session):
+    """Invalidation drops the shared entry, so the next call fetches a new token."""
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    invalidate_access_token()
+    assert cache.get(CACHE_KEY) is None
+    assert get_access_token("APPID", "SECRET") == "TOKEN_2"
+
+def test_get_access_token_requires_credentials():
+    with pytest.raises(ValueError):
+        get_access_token("", "SECRET")
+
+
+# --- File-based token store (Django cache without an atomic add) ---
+
+@pytest.fixture
+def token_files(monkeypatch, tmp_path):
+    """Routes get_access_token through the flock-ed token files in tmp_path."""
+    if auth.fcntl is None:
+        pytest.skip("fcntl not available")
+    monkeypatch.setattr(auth, '_use_token_file', lambda: True)
+    monkeypatch.setattr(auth, 'TOKEN_FILE_DIR', str(tmp_path))
+    return tmp_path
+
+@pytest.mark.parametrize("backend_cls, location, use_file", [
+    (LocMemCache, 'auth-test', True), # Not shared between processes
+    (FileBasedCache, None, True), # add() is has_key() then set()
+    (RedisCache, 'redis://localhost:6379/0', False), # Never connected
+])
+def test_use_token_file_detection(monkeypatch, tmp_path, backend_cls, location, use_file):
+    monkeypatch.setattr(auth, 'caches', {DEFAULT_CACHE_ALIAS: backend_cls(location or str(tmp_path), {})})
+    assert _use_token_file() is use_file
+
+def test_file_token_shared_between_processes(fake_session, token_files):
+    """A token written by one process is read back by the next instead of being re-fetched."""
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    token_file = token_files / "wechat_token_APPID.json"
+    assert oct(token_file.stat().st_mode & 0o777) == oct(0o600)
+    assert json.loads(token_file.read_text())["token"] == "TOKEN_1"
+
+    auth._token_files.clear() # As if in another process
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    assert fake_session.gets == 1
+    assert cache.get(CACHE_KEY) is None # Django cache not used on this path
+
+def test_file_token_refetched_when_expired_or_invalidated(fake_session, token_files):
+    """Tokens inside the expiry buffer are replaced; invalidation empties the file."""
+    token_file = token_files / "wechat_token_APPID.json"
+    token_file.write_text(json.dumps({"token": "OLD", "expires_at": time.time() + 10}))
+    token_file.chmod(0o600)
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    invalidate_access_token()
+    assert get_access_token("APPID", "SECRET") == "TOKEN_2"
+
+def test_file_token_concurrent_threads_fetch_once(fake_session, token_files):
+    """The flock serializes fetches, so racing callers share one token."""
+    fake_session.delay = 0.05
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_access_token("APPID", "SECRET"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["TOKEN_1"] * 4
+    assert fake_session.gets == 1
+
+def test_file_token_default_dir_is_cache_dir(fake_session, token_files, monkeypatch, settings, tmp_path):
+    """Without TOKEN_FILE_DIR the token goes to the project's (private) CACHE_DIR, not the shared temp dir."""
+    monkeypatch.setattr(auth, 'TOKEN_FILE_DIR', None)
+    settings.CACHE_DIR = tmp_path / "cache"
+    assert get_access_token("APPID", "SECRET") == "TOKEN_1"
+    assert (tmp_path / "cache" / "wechat_token_APPID.json").is_file()
+
+def test_file_token_refuses_symlink(fake_session, token_files):
+    target = token_files / "elsewhere.txt"
+    target.write_text("not a token")
+    (token_files / "wechat_token_APPID.json").symlink_to(target)
+    with pytest.raises(OSError):
+        get_access_token("APPID", "SECRET")
+    assert target.read_text() == "not a token"
+    assert fake_session.gets == 0
+
+def test_file_token_refuses_loose_permissions(fake_session, token_files):
+    """A pre-created file readable by others is not trusted with the token."""
+    token_file = token_files / "wechat_token_APPID.json"
+    token_file.write_text("")
+    token_file.chmod(0o644)
+    with pytest.raises(PermissionError):
+        get_access_token("APPID", "SECRET")
+    assert fake_session.gets == 0
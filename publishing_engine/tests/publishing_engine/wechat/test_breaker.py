@@ -0,0 +1,73 @@
+# publishing_engine/tests/publishing_engine/wechat/test_breaker.py
+
+import pytest
+from django.core.cache import cache
+
+from publishing_engine.wechat import breaker
+from publishing_engine.wechat.breaker import CircuitBreaker
+from publishing_engine.wechat.exceptions import WeChatCircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the breaker module."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(breaker.time, 'time', lambda: now[0])
+    return now
+
+@pytest.fixture
+def circuit(locmem_cache):
+    """A breaker whose state lives in conftest's per-test LocMemCache."""
+    cache.clear()
+    yield CircuitBreaker("test", failure_threshold=3, failure_window=60, open_seconds=30)
+    cache.clear()
+
+
+def test_closed_until_threshold(circuit, clock):
+    """Fewer failures than the threshold keep the circuit closed."""
+    circuit.record_failure()
+    circuit.record_failure()
+    circuit.before_call() # Doesn't raise
+
+def test_success_resets_failure_count(circuit, clock):
+    """Failures must be consecutive: a success in between starts the count over."""
+    circuit.record_failure()
+    circuit.record_failure()
+    circuit.record_success()
+    circuit.record_failure()
+    circuit.record_failure()
+    circuit.before_call()
+
+def test_opens_then_half_opens_for_one_probe(circuit, clock):
+    """Open: every call fails fast. After open_seconds exactly one probe goes through."""
+    for _ in range(3):
+        circuit.record_failure()
+    with pytest.raises(WeChatCircuitOpenError):
+        circuit.before_call()
+
+    clock[0] += 31
+    circuit.before_call() # The probe
+    with pytest.raises(WeChatCircuitOpenError, match="probe already in flight"):
+        circuit.before_call()
+
+    circuit.record_success()
+    circuit.before_call()
+    circuit.before_call()
+
+def test_failed_probe_reopens(circuit, clock):
+    """A failing probe re-opens the circuit for another open_seconds."""
+    for _ in range(3):
+        circuit.record_failure()
+    clock[0] += 31
+    circuit.before_call()
+    circuit.record_failure()
+    with pytest.raises(WeChatCircuitOpenError, match="circuit open"):
+        circuit.before_call()
+
+def test_state_shared_between_instances(circuit, clock):
+    """Another worker's breaker (same name) sees the open circuit through the cache."""
+    for _ in range(3):
+        circuit.record_failure()
+    other_worker = CircuitBreaker("test", failure_threshold=3, failure_window=60, open_seconds=30)
+    with pytest.raises(WeChatCircuitOpenError):
+        other_worker.before_call()
@@ -0,0 +1,26 @@
+# publishing_engine/tests/publishing_engine/wechat/test_schemas.py
+
+import pytest
+from pydantic import ValidationError
+
+from publishing_engine.wechat.schemas import AddDraftResponse, UploadImageResponse
+
+
+def test_model_validate_json_from_bytes():
+    """Raw response bodies validate directly, ignoring fields the models don't declare."""
+    resp = AddDraftResponse.model_validate_json(b'{"media_id": "MEDIA_ID", "item": []}')
+    assert resp.media_id == "MEDIA_ID"
+    assert resp.errcode == 0
+    assert not hasattr(resp, "item")
+
+def test_responses_are_frozen():
+    resp = UploadImageResponse.model_validate_json(b'{"url": "http://mmbiz.qpic.cn/a.jpg"}')
+    with pytest.raises(ValidationError):
+        resp.errcode = 1
+
+def test_url_kept_as_string():
+    """URLs are only checked for an http(s) scheme and returned unchanged."""
+    url = "http://mmbiz.qpic.cn/mmbiz_jpg/abc/0?wx_fmt=jpeg"
+    assert UploadImageResponse.model_validate_json(f'{{"url": "{url}"}}').url == url
+    with pytest.raises(ValidationError):
+        UploadImageResponse.model_validate_json(b'{"url": "not a url"}')
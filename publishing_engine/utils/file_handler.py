@@ -10,6 +10,7 @@ Output: file content or writes content to disk
 """
 
 import logging
+import os
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -18,14 +19,14 @@ def read_file(filepath: str | Path, encoding: str = 'utf-8') -> str:
     """Reads and returns the contents of a file."""
     path = Path(filepath)
     if not path.is_file():
-        logger.error(f"Attempted to read a non-existent file: {filepath}")
+        logger.error("Attempted to read a non-existent file: %s", filepath)
         raise FileNotFoundError(f"File not found: {filepath}")
     try:
         content = path.read_text(encoding=encoding)
-        logger.info(f"File read successfully: {filepath}")
+        logger.info("File read successfully: %s", filepath)
         return content
     except Exception as e:
-        logger.error(f"Failed to read file {filepath}: {e}")
+        logger.error("Failed to read file %s: %s", filepath, e)
         raise RuntimeError(f"Failed to read file {filepath}") from e
 
 
@@ -35,8 +36,18 @@ def write_file(filepath: str | Path, content: str, encoding: str = 'utf-8') -> N
     try:
         # Ensure parent directory exists
         path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(content, encoding=encoding)
-        logger.info(f"Content written to file: {filepath}")
+        data = memoryview(content.encode(encoding)) # Single encode; no text-layer write buffer
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+            # Output is write-once; start writeback and let the kernel drop it from the page cache
+            if hasattr(os, 'posix_fadvise'): # Not available on macOS/Windows
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        logger.info("Content written to file: %s", filepath)
     except Exception as e:
-        logger.error(f"Failed to write to file {filepath}: {e}")
+        logger.error("Failed to write to file %s: %s", filepath, e)
         raise RuntimeError(f"Failed to write to file {filepath}") from e
@@ -1,43 +1,100 @@
 # /Users/junluo/Documents/wechat_publisher_web/publishing_engine/utils/hashing_checking.py
 
+import functools
 import hashlib
 import logging
+import mmap
+import stat
+import threading
 from pathlib import Path
 
+# Optional SIMD/multithreaded BLAKE3 for content fingerprints; SHA-256 otherwise
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
 # Use the logger configured in settings.py for the 'publishing_engine'
 logger = logging.getLogger(__name__) # Will inherit from 'publishing_engine.utils'
 
-def calculate_file_hash(file_path: Path | str, algorithm: str = 'sha256', buffer_size: int = 65536) -> str | None:
+# Algorithm for non-cryptographic content fingerprints (dedup / upload cache keys)
+FINGERPRINT_ALGORITHM = 'blake3' if blake3 is not None else 'sha256'
+
+_tls = threading.local()
+
+def _read_buffer(size: int) -> bytearray:
+    """Per-thread read buffer for the readinto() fallback, reused across calls."""
+    buf = getattr(_tls, 'buf', None)
+    if buf is None or len(buf) != size:
+        buf = _tls.buf = bytearray(size)
+    return buf
+
+def _hash_file(path: Path, algorithm: str, buffer_size: int) -> bytes:
+    """Hashes the file in C: hashlib.file_digest on 3.11+, else one update() over an mmap."""
+    if algorithm == 'blake3':
+        if blake3 is None:
+            raise ValueError("algorithm 'blake3' requires the blake3 package")
+        # Memory-maps the file in Rust and hashes it on multiple threads
+        return blake3.blake3(max_threads=blake3.blake3.AUTO).update_mmap(path).digest()
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, algorithm).digest()
+        hasher = hashlib.new(algorithm)
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hasher.update(mm)
+        except (ValueError, OSError):
+            # Empty files (and some filesystems) can't be mmapped; fall back to buffered reads
+            buf = _read_buffer(buffer_size)
+            view = memoryview(buf)
+            while n := f.readinto(buf):
+                hasher.update(view[:n])
+        return hasher.digest()
+
+@functools.lru_cache(maxsize=1024)
+def _hash_cached(path_str: str, mtime_ns: int, size: int, algorithm: str, buffer_size: int) -> bytes:
+    """Memoized _hash_file; mtime_ns and size are part of the key so edited files are re-hashed."""
+    return _hash_file(Path(path_str), algorithm, buffer_size)
+
+def calculate_file_digest(file_path: Path | str, algorithm: str = 'sha256', buffer_size: int = 65536) -> bytes | None:
     """
-    Calculates the hash of a file's content.
+    Calculates the raw (binary) hash of a file's content; half the size of the hex form,
+    for callers that only compare digests or use them as keys.
+    Results are cached per (path, mtime, size, algorithm), so re-publishing an
+    unchanged image doesn't re-read it.
 
     Args:
         file_path: Path object or string path to the file.
-        algorithm: Hash algorithm (e.g., 'sha256', 'md5').
-        buffer_size: Size of chunks to read from the file.
+        algorithm: Hash algorithm (e.g., 'sha256', 'md5', or 'blake3' if the blake3 package is installed).
+        buffer_size: Size of chunks to read from the file (only used by the pre-3.11 fallback for empty files).
 
     Returns:
-        The hex digest of the file hash, or None if the file doesn't exist or an error occurs.
+        The digest bytes, or None if the file doesn't exist or an error occurs.
     """
     try:
         path = Path(file_path)
-        if not path.is_file():
-            logger.error(f"Cannot calculate hash. File not found: {path}")
+        stat_result = path.stat() # One stat serves both the regular-file check and the cache key
+        if not stat.S_ISREG(stat_result.st_mode):
+            logger.error("Cannot calculate hash. Not a regular file: %s", path)
             return None
 
-        hasher = hashlib.new(algorithm)
-        with open(path, 'rb') as f:
-            while True:
-                data = f.read(buffer_size)
-                if not data:
-                    break
-                hasher.update(data)
-        hex_digest = hasher.hexdigest()
-        logger.debug(f"Calculated {algorithm} hash for {path}: {hex_digest}")
-        return hex_digest
-    except FileNotFoundError: # Explicitly catch FileNotFoundError again just in case path object behaves unexpectedly
-         logger.error(f"Cannot calculate hash. File not found during hashing: {file_path}")
+        digest = _hash_cached(str(path), stat_result.st_mtime_ns, stat_result.st_size, algorithm, buffer_size)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Calculated %s hash for %s: %s", algorithm, path, digest.hex())
+        return digest
+    except FileNotFoundError: # Missing file (at stat time, or removed before hashing)
+         logger.error("Cannot calculate hash. File not found: %s", file_path)
          return None
     except Exception as e:
-        logger.exception(f"Error calculating {algorithm} hash for {file_path}: {e}")
-        return None
\ No newline at end of file
+        logger.exception("Error calculating %s hash for %s: %s", algorithm, file_path, e)
+        return None
+
+def calculate_file_hash(file_path: Path | str, algorithm: str = 'sha256', buffer_size: int = 65536) -> str | None:
+    """
+    Calculates the hash of a file's content as a hex string (see calculate_file_digest).
+
+    Returns:
+        The hex digest of the file hash, or None if the file doesn't exist or an error occurs.
+    """
+    digest = calculate_file_digest(file_path, algorithm, buffer_size)
+    return digest.hex() if digest is not None else None
@@ -5,6 +5,7 @@ from pathlib import Path
 from PIL import Image
 import io
 import os
+import stat
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,14 @@ DEFAULT_JPEG_QUALITY = 85
 MIN_JPEG_QUALITY = 60
 QUALITY_STEP = 5
 
+# Pillow format names optimized via the JPEG quality search
+JPEG_FORMATS = frozenset({'JPEG', 'JPG'})
+
+def _write_buffer(buffer: io.BytesIO, output_path: Path) -> None:
+    """Writes an encoded image buffer to disk through a memoryview (no getvalue() copy)."""
+    with buffer.getbuffer() as view, open(output_path, 'wb') as f:
+        f.write(view)
+
 def ensure_image_size(
     image_path: Path,
     size_limit_kb: int,
@@ -45,34 +54,40 @@ def ensure_image_size(
         ValueError: If the image cannot be processed or size reduction fails.
         ImportError: If Pillow is not installed.
     """
-    if not image_path.is_file():
+    # One stat() both checks for a regular file and gives the size
+    try:
+        st = image_path.stat()
+    except OSError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
         raise FileNotFoundError(f"Image file not found at: {image_path}")
 
     size_limit_bytes = size_limit_kb * 1024
-    original_size = image_path.stat().st_size
+    original_size = st.st_size
 
     if original_size <= size_limit_bytes:
-        logger.debug(f"Image '{image_path.name}' ({original_size / 1024:.1f} KB) is within limit ({size_limit_kb} KB).")
+        logger.debug("Image '%s' (%.1f KB) is within limit (%s KB).", image_path.name, original_size / 1024, size_limit_kb)
         return image_path
 
-    logger.info(f"Image '{image_path.name}' ({original_size / 1024:.1f} KB) exceeds limit ({size_limit_kb} KB). Attempting optimization...")
+    logger.info("Image '%s' (%.1f KB) exceeds limit (%s KB). Attempting optimization...", image_path.name, original_size / 1024, size_limit_kb)
 
     try:
         img = Image.open(image_path)
         # Preserve original format if known, default to JPEG otherwise
         img_format = img.format if img.format else 'JPEG'
+        source_is_jpeg = img.format == 'JPEG'
         output_suffix = image_path.suffix.lower()
 
         # Ensure image mode is compatible (convert indexed/etc. to RGB/RGBA)
         if img.mode == 'P': # Indexed color
              img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
-             logger.debug(f"Converted indexed image '{image_path.name}' mode to {img.mode}.")
+             logger.debug("Converted indexed image '%s' mode to %s.", image_path.name, img.mode)
              # Decide output format after conversion (PNG preserves transparency)
              img_format = 'PNG' if img.mode == 'RGBA' else 'JPEG'
              output_suffix = '.png' if img.mode == 'RGBA' else '.jpg'
         elif img.mode not in ('RGB', 'RGBA', 'L'): # L = Grayscale
              img = img.convert('RGB')
-             logger.debug(f"Converted image '{image_path.name}' mode '{img.mode}' to RGB.")
+             logger.debug("Converted image '%s' mode '%s' to RGB.", image_path.name, img.mode)
              img_format = 'JPEG'
              output_suffix = '.jpg'
 
@@ -80,80 +95,99 @@ def ensure_image_size(
         output_filename = f"{image_path.stem}_optimized{output_suffix}"
         output_path = image_path.with_name(output_filename)
 
-        current_quality = quality
         saved = False
         buffer = io.BytesIO()
 
         # --- Optimization Strategy ---
 
         # 1. Try saving with current settings (or reduced quality for JPEG)
-        is_jpeg = img_format.upper() in ['JPEG', 'JPG']
+        is_jpeg = img_format.upper() in JPEG_FORMATS
         if is_jpeg:
-            logger.debug(f"Attempting JPEG quality reduction for '{image_path.name}'. Start quality: {current_quality}")
-            while current_quality >= min_quality:
-                buffer.seek(0)
-                buffer.truncate(0)
+            # Encoded size falls as quality falls, so binary-search the quality ladder
+            # (quality, quality - step, ..., >= min_quality) for the highest one that fits
+            candidates = list(range(quality, min_quality - 1, -step))
+            logger.debug("Attempting JPEG quality reduction for '%s'. Start quality: %s", image_path.name, quality)
+            lo, hi = 0, len(candidates) - 1
+            best = None # (quality, encoded buffer) of the best candidate under the limit
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                current_quality = candidates[mid]
+                buffer = io.BytesIO() # Fresh buffer per probe, so the best one can be kept without copying it
                 img.save(buffer, format='JPEG', quality=current_quality, optimize=True)
                 buffer_size = buffer.tell()
                 if buffer_size <= size_limit_bytes:
-                    with open(output_path, 'wb') as f:
-                        f.write(buffer.getvalue())
-                    logger.info(f"Optimized '{image_path.name}' via quality ({current_quality}) to {buffer_size / 1024:.1f} KB -> '{output_path.name}'.")
-                    saved = True
-                    break
-                logger.debug(f"Quality {current_quality} still too large ({buffer_size / 1024:.1f} KB).")
-                current_quality -= step
-            if saved: return output_path
+                    best = (current_quality, buffer)
+                    hi = mid - 1 # Fits; try a higher quality
+                else:
+                    logger.debug("Quality %s still too large (%.1f KB).", current_quality, buffer_size / 1024)
+                    lo = mid + 1
+            if best is not None:
+                best_quality, best_buffer = best
+                _write_buffer(best_buffer, output_path)
+                logger.info("Optimized '%s' via quality (%s) to %.1f KB -> '%s'.", image_path.name, best_quality, best_buffer.tell() / 1024, output_path.name)
+                return output_path
 
         # 2. If still too large (or not JPEG), try resizing
         if not saved:
-            logger.debug(f"Quality reduction insufficient or not applicable. Attempting resize for '{image_path.name}'.")
+            logger.debug("Quality reduction insufficient or not applicable. Attempting resize for '%s'.", image_path.name)
             original_width, original_height = img.size
             scale_factor = (size_limit_bytes / original_size) ** 0.5  # Estimate scale based on size ratio sqrt
             scale_factor = min(scale_factor, 0.95) # Don't start too aggressively, ensure some reduction
 
+            # JPEG sources: decode again in draft mode so libjpeg scales in the DCT domain (1/2, 1/4, 1/8)
+            # to the smallest size still >= the first resize target; every LANCZOS pass then reads fewer pixels
+            resize_source = img
+            if source_is_jpeg:
+                draft_img = Image.open(image_path)
+                draft_img.draft(img.mode, (max(1, int(original_width * scale_factor)), max(1, int(original_height * scale_factor))))
+                draft_img.load()
+                if draft_img.mode != img.mode:
+                    draft_img = draft_img.convert(img.mode)
+                if draft_img.size != img.size:
+                    logger.debug("Decoded '%s' in draft mode at %dx%d.", image_path.name, *draft_img.size)
+                resize_source = draft_img
+
+            # Encoder settings don't change between attempts
+            save_format = 'PNG' if img_format.upper() == 'PNG' else 'JPEG'
+            save_params = {'optimize': True}
+            if save_format == 'JPEG':
+                save_params['quality'] = quality # Use target quality after resize
+
             while scale_factor > 0.1: # Safety net to avoid excessive shrinking
                 new_width = max(1, int(original_width * scale_factor))
                 new_height = max(1, int(original_height * scale_factor))
-                logger.debug(f"Resizing '{image_path.name}' to {new_width}x{new_height} (scale: {scale_factor:.2f})")
+                logger.debug("Resizing '%s' to %dx%d (scale: %.2f)", image_path.name, new_width, new_height, scale_factor)
                 try:
-                    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    resized_img = resize_source.resize((new_width, new_height), Image.Resampling.LANCZOS)
                 except ValueError as resize_err:
-                    logger.error(f"Error during resize attempt: {resize_err}")
+                    logger.error("Error during resize attempt: %s", resize_err)
                     break # Stop if resize fails
 
                 buffer.seek(0)
                 buffer.truncate(0)
-                save_format = 'PNG' if img_format.upper() == 'PNG' else 'JPEG'
-                save_params = {'optimize': True}
-                if save_format == 'JPEG':
-                    save_params['quality'] = quality # Use target quality after resize
-
                 resized_img.save(buffer, format=save_format, **save_params)
                 buffer_size = buffer.tell()
 
                 if buffer_size <= size_limit_bytes:
-                    with open(output_path, 'wb') as f:
-                        f.write(buffer.getvalue())
-                    logger.info(f"Resized and saved '{image_path.name}' to {buffer_size / 1024:.1f} KB ({new_width}x{new_height}) -> '{output_path.name}'.")
+                    _write_buffer(buffer, output_path)
+                    logger.info("Resized and saved '%s' to %.1f KB (%dx%d) -> '%s'.", image_path.name, buffer_size / 1024, new_width, new_height, output_path.name)
                     saved = True
                     break
                 else:
-                    logger.debug(f"Resized image still too large ({buffer_size / 1024:.1f} KB). Reducing scale factor.")
+                    logger.debug("Resized image still too large (%.1f KB). Reducing scale factor.", buffer_size / 1024)
                     scale_factor *= 0.9 # Reduce scale further for next attempt
 
         if not saved:
             # Last resort: Save JPEG at minimum quality without resizing (if applicable)
-            if is_jpeg and current_quality < min_quality: # Only if quality reduction was attempted
-                logger.warning(f"Resize failed or insufficient for '{image_path.name}'. Trying final save at min quality {min_quality}.")
+            if is_jpeg: # Quality reduction was attempted and nothing fit
+                logger.warning("Resize failed or insufficient for '%s'. Trying final save at min quality %s.", image_path.name, min_quality)
                 buffer.seek(0)
                 buffer.truncate(0)
                 img.save(buffer, format='JPEG', quality=min_quality, optimize=True)
                 buffer_size = buffer.tell()
                 if buffer_size <= size_limit_bytes:
-                    with open(output_path, 'wb') as f:
-                        f.write(buffer.getvalue())
-                    logger.info(f"Saved '{image_path.name}' at min quality ({min_quality}) to {buffer_size / 1024:.1f} KB -> '{output_path.name}'.")
+                    _write_buffer(buffer, output_path)
+                    logger.info("Saved '%s' at min quality (%s) to %.1f KB -> '%s'.", image_path.name, min_quality, buffer_size / 1024, output_path.name)
                     saved = True
                     return output_path
 
@@ -168,6 +202,6 @@ def ensure_image_size(
         logger.critical("Pillow library is not installed. Please install it: pip install Pillow")
         raise ImportError("Pillow library is required for image processing.")
     except Exception as e:
-        logger.exception(f"Error processing image '{image_path.name}': {e}")
+        logger.exception("Error processing image '%s': %s", image_path.name, e)
         # Include original image path in error for context
-        raise ValueError(f"Failed to process image '{image_path.name}': {e}") from e
\ No newline at end of file
+        raise ValueError(f"Failed to process image '{image_path.name}': {e}") from e
@@ -6,41 +6,229 @@ Handles requests to WeChat APIs (uploading media, articles).
 
 Dependencies:
     - requests
-    - exceptions.WechatAPIError # Assuming you might have this defined elsewhere
+    - exceptions.WeChatAPIError
     - auth (to get access tokens) # Assuming you have an auth mechanism
 
 Input: Payload data, media files
 Output: API responses (media IDs, URLs)
 """
+import functools
+import os
+import socket
+import stat
+import random
+import time
 import requests
 import logging
 from pathlib import Path
-from typing import Optional, Dict, Any
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+from typing import BinaryIO, Callable, Optional, Dict, Any
 import json # Make sure json is imported
 
+from . import auth
+from .breaker import CircuitBreaker
+from .exceptions import WeChatAPIError
+
 # If using schemas: from .schemas import UploadImageResponse, AddMaterialResponse, AddDraftResponse, BaseResponse
 # Otherwise, handle dictionaries directly.
 
+# Optional fast JSON encoder for draft payloads; stdlib json otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 # Can remove the logger name check if you added it earlier
 # logger.error(f"***** Logger name configured in api.py: {__name__} *****")
 
+USER_AGENT = "wechat-publisher/1.0"
+
+# Connections kept per host: html_processor.MAX_UPLOAD_WORKERS uploads for each of several
+# publishes running at once in a worker process
+POOL_MAXSIZE = 32
+
+# --- Retry policy for transient failures ---
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0 # seconds; doubled per attempt, plus up to 50% jitter
+RETRY_MAX_DELAY = 30.0
+# HTTP statuses worth retrying. For non-idempotent calls only the ones where the
+# server says it did not process the request.
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+SAFE_RETRY_STATUS_CODES = frozenset({429, 503})
+# WeChat errcodes meaning "not processed, try again later": -1 system busy, 45011 API called too often
+TRANSIENT_ERRCODES = frozenset({-1, 45011})
+# The access token was rejected; retrying with the same token can't succeed
+INVALID_TOKEN_ERRCODES = frozenset({40001, 40014, 42001})
+
+def _transport_retry(idempotent: bool) -> Retry:
+    """
+    urllib3 retry policy for connection errors and retryable HTTP statuses (honours Retry-After).
+    Non-idempotent requests are only retried when the server can't have processed them:
+    connect failures and 429/503; read errors are never retried for them.
+    """
+    return Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES if idempotent else 0,
+        status=MAX_RETRIES,
+        other=0,
+        status_forcelist=RETRYABLE_STATUS_CODES if idempotent else SAFE_RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET", "POST"}), # WeChat's upload endpoints are POST
+        backoff_factor=RETRY_BASE_DELAY,
+        backoff_max=RETRY_MAX_DELAY,
+        backoff_jitter=RETRY_BASE_DELAY / 2,
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the last response to _check_response for the usual error
+    )
+
+# urllib3's defaults (TCP_NODELAY) plus TCP keepalive probes, so pooled connections
+# idling between publishes aren't silently dropped by NAT/load-balancer idle timeouts
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, 'TCP_KEEPIDLE'): # Linux: probe after 60s idle instead of the 2h system default
+    KEEPALIVE_SOCKET_OPTIONS += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60), (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15)]
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets use KEEPALIVE_SOCKET_OPTIONS."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = KEEPALIVE_SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+def _new_session(idempotent: bool = True) -> requests.Session:
+    """Session with a connection pool sized for the concurrent content-image uploads."""
+    session = requests.Session()
+    # pool_block=False: past POOL_MAXSIZE, open an extra (unpooled) connection rather than wait
+    session.mount('https://', _KeepAliveAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, pool_block=False, max_retries=_transport_retry(idempotent)))
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+# Shared by every call in this module so urllib3 keeps the TLS connection to
+# api.weixin.qq.com alive between requests (one handshake instead of one per upload).
+# Drafts get their own session because creating one isn't idempotent (see _transport_retry).
+_SESSION = _new_session()
+_DRAFT_SESSION = _new_session(idempotent=False)
+
+def _reset_session_after_fork() -> None:
+    """Forked workers (e.g. Celery prefork) must not share the parent's pooled sockets."""
+    global _SESSION, _DRAFT_SESSION
+    _SESSION = _new_session()
+    _DRAFT_SESSION = _new_session(idempotent=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_session_after_fork)
+
+def _regular_file_size(path: Path) -> Optional[int]:
+    """Size of path from a single stat(), or None if it is missing or not a regular file."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+# Leading bytes of the image formats WeChat accepts (extensions can lie, e.g. WebP saved as .png)
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+
+def _sniff_image(f: BinaryIO) -> Optional[str]:
+    """MIME type of an open image file from its first 12 bytes, or None if it isn't JPEG/PNG."""
+    head = f.read(12)
+    for signature, mime in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+# Fields every draft article needs as non-empty strings; WeChat rejects the draft otherwise
+DRAFT_ARTICLE_REQUIRED_FIELDS = ('title', 'content', 'thumb_media_id')
+
+def _validate_draft_payload(draft_payload: Dict[str, Any]) -> None:
+    """Checks the draft structure locally, so a malformed payload fails before the round trip to WeChat."""
+    articles = draft_payload.get("articles") if isinstance(draft_payload, dict) else None
+    if not isinstance(articles, list) or not articles:
+        raise ValueError("Draft payload must contain a non-empty 'articles' list.")
+    for index, article in enumerate(articles):
+        if not isinstance(article, dict):
+            raise ValueError(f"Draft payload articles[{index}] must be an object.")
+        for field in DRAFT_ARTICLE_REQUIRED_FIELDS:
+            value = article.get(field)
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"Draft payload articles[{index}].{field} must be a non-empty string.")
+
+# Endpoint paths, joined to base_url by _endpoint_url
+_ENDPOINTS = MappingProxyType({
+    'uploadimg': '/cgi-bin/media/uploadimg',
+    'add_material': '/cgi-bin/material/add_material',
+    'add_draft': '/cgi-bin/draft/add',
+})
+# Explicit charset: WeChat misreads the draft body without it (read-only, shared by every call)
+DRAFT_HEADERS = MappingProxyType({'Content-Type': 'application/json; charset=utf-8'})
+
+@functools.lru_cache(maxsize=16)
+def _endpoint_url(base_url: str, endpoint: str) -> str:
+    """Full URL of an _ENDPOINTS entry; base_url is nearly always the production default."""
+    return f"{base_url}{_ENDPOINTS[endpoint]}"
+
+# Shared by the upload and draft endpoints: an outage affects them all
+_BREAKER = CircuitBreaker("api", failure_threshold=5, failure_window=60, open_seconds=30)
+
+def _retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter, so parallel uploads don't retry in lockstep."""
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt * (1 + random.random() * 0.5))
+
+def _send_with_retry(send: Callable[[], requests.Response], max_retries: int = MAX_RETRIES) -> Dict[str, Any]:
+    """
+    Calls send() and checks the response (see _check_response). Transport errors and
+    HTTP statuses are already retried inside urllib3 (see _transport_retry); this only
+    retries WeChat's "busy" errcodes, which arrive in a 200 JSON body, with backoff.
+    A rejected access token invalidates the auth cache and is raised without retrying.
+    While the circuit breaker is open, raises WeChatCircuitOpenError without sending.
+    """
+    attempt = 0
+    while True:
+        _BREAKER.before_call()
+        try:
+            response = send()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            _BREAKER.record_failure()
+            raise
+        if response.status_code >= 500:
+            _BREAKER.record_failure()
+        else:
+            _BREAKER.record_success() # WeChat answered, even if with an errcode
+        try:
+            return _check_response(response)
+        except WeChatAPIError as e:
+            if e.errcode in INVALID_TOKEN_ERRCODES:
+                auth.invalidate_access_token()
+                raise
+            if e.errcode not in TRANSIENT_ERRCODES or attempt >= max_retries:
+                raise
+            delay = _retry_delay(attempt)
+            attempt += 1
+            logger.warning("WeChat API busy (errcode %s); retry %d/%d in %.1fs.", e.errcode, attempt, max_retries, delay)
+        time.sleep(delay)
+
 def _check_response(response: requests.Response) -> Dict[str, Any]:
     """Helper to check response status and decode JSON, handling errors."""
     try:
         response.raise_for_status() # Check for HTTP errors
         data = response.json()
     except requests.exceptions.Timeout:
-        logger.error(f"Request timed out: {response.request.url}")
+        logger.error("Request timed out: %s", response.request.url)
         raise RuntimeError(f"Request timed out: {response.request.url}")
     except requests.exceptions.RequestException as e:
         # Log the request URL from the original request if available
         request_url = response.request.url if response.request else "Unknown URL"
-        logger.error(f"Network error during API call to {request_url}: {e}")
+        logger.error("Network error during API call to %s: %s", request_url, e)
         raise RuntimeError(f"Network error during API call to {request_url}") from e
     except ValueError as e: # Includes JSON decoding errors
         request_url = response.request.url if response.request else "Unknown URL"
-        logger.error(f"Failed to decode JSON response from {request_url}: {response.text}")
+        logger.error("Failed to decode JSON response from %s: %s", request_url, response.text)
         raise RuntimeError(f"Invalid response from {request_url}: {response.text}") from e
 
     # Check for WeChat specific error codes
@@ -48,8 +236,7 @@ def _check_response(response: requests.Response) -> Dict[str, Any]:
          request_url = response.request.url if response.request else "Unknown URL"
          error_msg = f"WeChat API error ({request_url}): {data.get('errcode')} - {data.get('errmsg', 'Unknown error')}"
          logger.error(error_msg)
-         # Consider raising a custom WechatAPIError if defined
-         raise RuntimeError(error_msg) # Raise an error for WeChat API errors
+         raise WeChatAPIError(error_msg, errcode=data.get('errcode'), errmsg=data.get('errmsg')) # RuntimeError subclass
 
     return data
 
@@ -72,40 +259,43 @@ def upload_content_image(access_token: str, image_path: str | Path, base_url: st
         RuntimeError: If the API request fails or returns an error.
     """
     path = Path(image_path)
-    if not path.is_file():
+    file_size = _regular_file_size(path) # One stat() for the existence and size checks
+    if file_size is None:
         raise FileNotFoundError(f"Content image not found: {image_path}")
 
-    # Basic validation (can be enhanced with Pillow or python-magic)
-    file_size = path.stat().st_size
-    suffix = path.suffix.lower()
-    if suffix not in ['.jpg', '.jpeg', '.png']:
-        raise ValueError(f"Invalid content image type ({suffix}). Must be JPG or PNG: {image_path}")
+    # Basic validation (type is checked from the file's magic bytes once it is open)
     if file_size > 1 * 1024 * 1024: # 1 MB limit
          raise ValueError(f"Content image size ({file_size / 1024:.1f} KB) exceeds 1MB limit: {image_path}")
 
-    upload_url = f"{base_url}/cgi-bin/media/uploadimg"
+    upload_url = _endpoint_url(base_url, 'uploadimg')
     params = {"access_token": access_token}
 
     try:
         with open(path, 'rb') as f:
+            # Sniff before uploading: WeChat would only reject a mislabeled file after the full upload
+            mime = _sniff_image(f)
+            if mime is None:
+                raise ValueError(f"Invalid content image type ({path.suffix.lower()} file is not JPEG/PNG data). Must be JPG or PNG: {image_path}")
             # Ensure filename in files tuple matches the actual filename
-            files = {'media': (path.name, f, 'image/jpeg' if suffix in ['.jpg', '.jpeg'] else 'image/png')}
-            logger.info(f"Uploading content image '{path.name}' to WeChat...")
-            response = requests.post(upload_url, params=params, files=files, timeout=60) # Increased timeout for uploads
-        data = _check_response(response) # Handles HTTP/network/WeChat errors
+            files = {'media': (path.name, f, mime)}
+            logger.info("Uploading content image '%s' to WeChat...", path.name)
+            def send() -> requests.Response:
+                f.seek(0) # Rewind for retries
+                return _SESSION.post(upload_url, params=params, files=files, timeout=60) # Increased timeout for uploads
+            data = _send_with_retry(send) # Handles HTTP/network/WeChat errors
 
         if "url" not in data:
              raise RuntimeError(f"WeChat API did not return 'url' after image upload: {data}")
         img_url = data["url"]
 
-        logger.info(f"Successfully uploaded content image {path.name}. URL: {img_url}")
+        logger.info("Successfully uploaded content image %s. URL: %s", path.name, img_url)
         return img_url
 
     except (FileNotFoundError, ValueError) as e: # Re-raise validation errors
-        logger.error(f"Validation failed for content image {image_path}: {e}")
+        logger.error("Validation failed for content image %s: %s", image_path, e)
         raise e
     except Exception as e: # Catch other potential errors like file read errors
-        logger.error(f"Failed to upload content image {image_path}: {e}", exc_info=True) # Add traceback
+        logger.error("Failed to upload content image %s: %s", image_path, e, exc_info=True) # Add traceback
         if isinstance(e, RuntimeError): # Don't wrap RuntimeErrors from _check_response
             raise e
         raise RuntimeError(f"Failed to upload content image {image_path}") from e
@@ -129,155 +319,116 @@ def upload_thumb_media(access_token: str, thumb_path: str | Path, base_url: str
         RuntimeError: If the API request fails or returns an error.
     """
     path = Path(thumb_path)
-    if not path.is_file():
+    file_size = _regular_file_size(path) # One stat() for the existence and size checks
+    if file_size is None:
         raise FileNotFoundError(f"Thumbnail image not found: {thumb_path}")
 
-    # Basic validation
-    file_size = path.stat().st_size
-    suffix = path.suffix.lower()
-    # WeChat doc says JPG, let's be strict but allow .jpeg too
-    if suffix not in ['.jpg', '.jpeg']:
-         raise ValueError(f"Invalid thumbnail image type ({suffix}). Must be JPG: {thumb_path}")
+    # Basic validation (type is checked from the file's magic bytes once it is open)
     if file_size > 64 * 1024: # 64 KB limit
          raise ValueError(f"Thumbnail image size ({file_size / 1024:.1f} KB) exceeds 64KB limit: {thumb_path}")
 
-    upload_url = f"{base_url}/cgi-bin/material/add_material"
+    upload_url = _endpoint_url(base_url, 'add_material')
     params = {"access_token": access_token, "type": "thumb"}
 
     try:
         with open(path, 'rb') as f:
+            # WeChat doc says JPG for thumbs
+            if _sniff_image(f) != 'image/jpeg':
+                raise ValueError(f"Invalid thumbnail image type ({path.suffix.lower()} file is not JPEG data). Must be JPG: {thumb_path}")
             # Ensure filename in files tuple matches the actual filename and specify content type
             files = {'media': (path.name, f, 'image/jpeg')}
-            logger.info(f"Uploading thumbnail image '{path.name}' to WeChat...")
-            response = requests.post(upload_url, params=params, files=files, timeout=45) # Adjusted timeout
-        data = _check_response(response)
+            logger.info("Uploading thumbnail image '%s' to WeChat...", path.name)
+            def send() -> requests.Response:
+                f.seek(0) # Rewind for retries
+                return _SESSION.post(upload_url, params=params, files=files, timeout=45) # Adjusted timeout
+            data = _send_with_retry(send)
 
         if "media_id" not in data:
             raise RuntimeError(f"WeChat API did not return 'media_id' after thumb upload: {data}")
         media_id = data["media_id"]
 
-        logger.info(f"Successfully uploaded thumbnail {path.name}. Media ID: {media_id}")
+        logger.info("Successfully uploaded thumbnail %s. Media ID: %s", path.name, media_id)
         return media_id
 
     except (FileNotFoundError, ValueError) as e: # Re-raise validation errors
-        logger.error(f"Validation failed for thumbnail image {thumb_path}: {e}")
+        logger.error("Validation failed for thumbnail image %s: %s", thumb_path, e)
         raise e
     except Exception as e: # Catch other potential errors
-        logger.error(f"Failed to upload thumbnail image {thumb_path}: {e}", exc_info=True) # Add traceback
+        logger.error("Failed to upload thumbnail image %s: %s", thumb_path, e, exc_info=True) # Add traceback
         if isinstance(e, RuntimeError):
             raise e
         raise RuntimeError(f"Failed to upload thumbnail image {thumb_path}") from e
 
 
 # --- UPDATED add_draft function ---
-def add_draft(access_token: str, draft_payload: Dict[str, Any], base_url: str = "https://api.weixin.qq.com") -> str:
+def add_draft(access_token: str, draft_payload: Dict[str, Any] | bytes, base_url: str = "https://api.weixin.qq.com") -> str:
     """
     Adds a new draft article to the WeChat Official Account using manual encoding.
 
     Args:
         access_token: Valid WeChat access token.
-        draft_payload: Dictionary representing the draft article structure ('articles' key).
+        draft_payload: Dictionary representing the draft article structure ('articles' key),
+                       or the same structure already serialized as UTF-8 JSON bytes.
         base_url: Base URL for WeChat API.
 
     Returns:
         The media_id of the created draft.
 
     Raises:
-        ValueError: If draft_payload is missing the 'articles' key or JSON prep fails.
+        ValueError: If draft_payload has no 'articles' list, an article lacks a required
+                    field (see DRAFT_ARTICLE_REQUIRED_FIELDS), or JSON prep fails.
         RuntimeError: If the API request fails or returns an error.
     """
-    if "articles" not in draft_payload or not isinstance(draft_payload["articles"], list) or not draft_payload["articles"]:
-        raise ValueError("Draft payload must contain a non-empty 'articles' list.")
+    is_preserialized = isinstance(draft_payload, (bytes, bytearray))
+    if not is_preserialized: # Pre-serialized bodies come from payload_builder, which validated them
+        _validate_draft_payload(draft_payload)
 
-    draft_url = f"{base_url}/cgi-bin/draft/add"
+    draft_url = _endpoint_url(base_url, 'add_draft')
     params = {"access_token": access_token}
 
     # --- Manual JSON Encoding ---
     try:
-        # 1. Serialize to JSON string with ensure_ascii=False
-        json_body_string = json.dumps(draft_payload, ensure_ascii=False)
-        # 2. Encode the string to UTF-8 bytes
-        request_body_bytes = json_body_string.encode('utf-8')
-        logger.debug(f"Manually prepared JSON body (UTF-8 Bytes sample): {request_body_bytes[:500]}...") # Log sample bytes
-        # For readable log, decode back (should show Chinese chars)
-        logger.debug(f"Manually prepared JSON body (Decoded for log): {request_body_bytes.decode('utf-8')}")
+        if is_preserialized:
+            # Already UTF-8 JSON; skip the encode pass
+            request_body_bytes = bytes(draft_payload)
+        elif orjson is not None:
+            # UTF-8 bytes in one native pass; non-ASCII is never escaped
+            request_body_bytes = orjson.dumps(draft_payload)
+        else:
+            # 1. Serialize to JSON string with ensure_ascii=False
+            json_body_string = json.dumps(draft_payload, ensure_ascii=False)
+            # 2. Encode the string to UTF-8 bytes
+            request_body_bytes = json_body_string.encode('utf-8')
+        if logger.isEnabledFor(logging.DEBUG): # Skip the decode pass unless it will be logged
+            # For readable log, decode back (should show Chinese chars, not \uXXXX escapes)
+            logger.debug("Manually prepared JSON body (Decoded for log): %s", request_body_bytes.decode('utf-8', errors='replace'))
 
     except Exception as json_err:
-        logger.error(f"Error during manual JSON preparation: {json_err}", exc_info=True)
+        logger.error("Error during manual JSON preparation: %s", json_err, exc_info=True)
         raise ValueError("Failed to prepare JSON payload for WeChat draft.") from json_err
 
-    # 3. Set explicit headers
-    headers = {
-        'Content-Type': 'application/json; charset=utf-8'
-    }
     # --- End Manual JSON Encoding ---
 
-    # Using session for potential connection reuse and prepare_request capability
-    session = requests.Session()
-    # 4. Use `data=` parameter with bytes, pass explicit headers
-    #    Remove the `json=` parameter
-    request = requests.Request(
-        "POST",
-        draft_url,
-        params=params,
-        data=request_body_bytes, # Use data= with bytes
-        headers=headers          # Pass explicit headers
-    )
-
     try:
-        # Prepare the request to inspect headers and body before sending (optional now, but good for verification)
-        prepared_request = session.prepare_request(request)
-
-        # --- DETAILED LOGGING (Verify Manual Preparation) ---
-        logger.debug("--- Preparing to send MANUALLY ENCODED request via Python requests ---")
-        logger.debug(f"Method: {prepared_request.method}")
-        logger.debug(f"URL: {prepared_request.url}")
-        logger.debug("Headers Sent:")
-        for key, value in prepared_request.headers.items():
-            logger.debug(f"  {key}: {value}") # Verify Content-Type includes charset=utf-8
-
-        request_body_log = prepared_request.body
-        if isinstance(request_body_log, bytes):
-            try:
-                decoded_body = request_body_log.decode('utf-8')
-                # CRITICAL CHECK: Should now show Chinese characters, not \uXXXX
-                logger.debug(f"Body Sent (decoded as UTF-8): {decoded_body}")
-            except UnicodeDecodeError:
-                logger.warning("Could not decode request body as UTF-8 for logging.")
-                logger.debug(f"Body Sent (bytes): {prepared_request.body}") # Log sample bytes if decode fails
-        elif request_body_log is not None:
-             logger.debug(f"Body Sent (type {type(request_body_log)}): {request_body_log}")
-        else:
-             logger.debug("Body Sent: None")
-
-        logger.debug("--- End of prepared request details ---")
-        # --- END DETAILED LOGGING ---
-
         logger.info("Submitting article as draft to WeChat (using manual encoding)...")
-
-        # Now send the prepared request
-        response = session.send(prepared_request, timeout=30) # Adjust timeout as needed
-
-        # Check response and extract media_id
-        data = _check_response(response) # Handles HTTP/network/WeChat errors
+        # Post the bytes with data= (not json=, which would re-serialize with ASCII escapes).
+        # Creating a draft isn't idempotent: _DRAFT_SESSION only retries when WeChat can't have processed it
+        data = _send_with_retry(lambda: _DRAFT_SESSION.post(draft_url, params=params, data=request_body_bytes, headers=DRAFT_HEADERS, timeout=30)) # Adjust timeout as needed
 
         if "media_id" not in data:
              raise RuntimeError(f"WeChat API did not return 'media_id' after adding draft: {data}")
         media_id = data["media_id"]
 
-        logger.info(f"Successfully created draft. Media ID: {media_id}")
+        logger.info("Successfully created draft. Media ID: %s", media_id)
         return media_id
 
     except Exception as e:
         # Use exc_info=True to log the full traceback for better debugging
-        logger.error(f"Failed to add draft: {e}", exc_info=True)
+        logger.error("Failed to add draft: %s", e, exc_info=True)
         if isinstance(e, (RuntimeError, ValueError)): # Re-raise specific handled errors
             raise e
         # Wrap other exceptions in a RuntimeError
         raise RuntimeError("Failed to add draft to WeChat") from e
-    finally:
-        # Ensure session is closed
-        session.close()
 
 
 # Example usage remains commented out
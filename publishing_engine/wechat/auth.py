@@ -2,22 +2,148 @@
 """
 Handles fetching and caching WeChat Official Account Access Tokens.
 """
+import contextlib
+import json
+import os
+import stat
+import tempfile
+import threading
 import time
 import logging
 import requests
-from typing import Optional, Tuple
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from requests.adapters import HTTPAdapter
+from typing import Iterator, Optional, Set, TextIO, Tuple
+
+try:
+    import fcntl # POSIX only; the file-based token store is skipped without it
+except ImportError:
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
-# --- In-memory cache ---
-# Simple approach for single-process scenarios (like development server or single worker)
-# For multi-process/multi-server setups, use Redis, Memcached, or Database cache.
-_token_cache = {
-    "access_token": None,
-    "expires_at": 0 # Unix timestamp when the token expires
-}
+USER_AGENT = "wechat-publisher/1.0"
+
+def _new_session() -> requests.Session:
+    """Keep-alive session for token requests (a token fetch is a single call, so one connection)."""
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+# Reused across token refreshes so the TLS connection is kept alive
+_SESSION = _new_session()
+
+def _reset_session_after_fork() -> None:
+    """Forked workers (e.g. Celery prefork) must not share the parent's pooled sockets."""
+    global _SESSION
+    _SESSION = _new_session()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_session_after_fork)
+
+# --- Token cache ---
+# Tokens live in Django's cache as (access_token, expires_at unix timestamp), so every
+# worker process shares one token (WeChat caps token fetches per day, and fetching a
+# new token invalidates the previous one).
+_token_cache_keys: Set[str] = set() # Keys this process has used, for invalidate_access_token
+_lock = threading.Lock() # Serializes fetches between threads of this process
+TOKEN_CACHE_KEY_PREFIX = "wechat_access_token_"
 # Safety buffer in seconds (request new token slightly before expiry)
 TOKEN_EXPIRY_BUFFER = 300 # 5 minutes
+# Cross-process fetch lock: held for at most this long (seconds), polled while waiting
+TOKEN_LOCK_TIMEOUT = 10
+TOKEN_LOCK_POLL_INTERVAL = 0.2
+# Unless Django's cache has an atomic add() to lock with (Redis/Memcached), e.g. the
+# per-process LocMemCache or the FileBasedCache (whose add() is has_key() then set()),
+# tokens are shared through flock-ed JSON files in this directory instead
+# (None: settings.CACHE_DIR, else a per-user directory in the system temp dir)
+TOKEN_FILE_DIR: Optional[str] = None
+_token_files: Set[Path] = set() # Token files this process has used, for invalidate_access_token
+
+def invalidate_access_token() -> None:
+    """Drops the cached token, e.g. after WeChat rejected it (errcode 40001/42001), so the next call fetches a new one."""
+    for cache_key in list(_token_cache_keys):
+        cache.delete(cache_key)
+    for path in list(_token_files):
+        with _locked_token_file(path) as f:
+            f.truncate(0)
+
+def _use_token_file() -> bool:
+    """
+    True unless the default Django cache can serve as the cross-process fetch lock:
+    it must be shared between processes and its add() atomic (Redis, Memcached).
+    """
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (RedisCache, BaseMemcachedCache))
+
+def _token_file_dir() -> Path:
+    """Directory for token files: TOKEN_FILE_DIR, the project's CACHE_DIR, or a per-user temp dir."""
+    if TOKEN_FILE_DIR:
+        return Path(TOKEN_FILE_DIR)
+    cache_dir = getattr(settings, 'CACHE_DIR', None)
+    if cache_dir:
+        return Path(cache_dir)
+    return Path(tempfile.gettempdir()) / f"wechat_publisher_{os.getuid()}"
+
+def _open_token_file(path: Path) -> int:
+    """
+    Opens a token file read/write, creating it with mode 0600. Tokens are credentials, so
+    symlinks are refused (O_NOFOLLOW) and an existing file must be a regular file owned
+    by this user with mode 0600; otherwise PermissionError is raised.
+    """
+    flags = os.O_RDWR | os.O_NOFOLLOW
+    try:
+        fd = os.open(path, flags | os.O_CREAT | os.O_EXCL, 0o600)
+        os.fchmod(fd, 0o600) # Whatever the umask
+        return fd
+    except FileExistsError:
+        pass
+    fd = os.open(path, flags)
+    st = os.fstat(fd)
+    if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) != 0o600:
+        os.close(fd)
+        raise PermissionError(f"Refusing to use token file {path}: it must be a regular file owned by this user with mode 0600.")
+    return fd
+
+@contextlib.contextmanager
+def _locked_token_file(path: Path) -> Iterator[TextIO]:
+    """Opens (creating, owner-only) a token file and holds an exclusive flock until closed."""
+    fd = _open_token_file(path)
+    with os.fdopen(fd, 'r+', encoding='utf-8') as f:
+        fcntl.flock(f, fcntl.LOCK_EX) # Released when the file is closed
+        yield f
+
+def _get_access_token_via_file(app_id: str, app_secret: str, base_url: str) -> str:
+    """get_access_token without an atomic shared cache: the token file's flock coalesces fetches across processes."""
+    token_dir = _token_file_dir()
+    os.makedirs(token_dir, mode=0o700, exist_ok=True)
+    path = token_dir / f"wechat_token_{app_id}.json"
+    _token_files.add(path)
+    with _locked_token_file(path) as f:
+        try:
+            entry = json.load(f)
+        except ValueError: # Empty (new or invalidated) or corrupt
+            entry = None
+        if entry and time.time() < (entry["expires_at"] - TOKEN_EXPIRY_BUFFER):
+            logger.info("Using access token from shared token file.")
+            return entry["token"]
+
+        token, expires_at = _fetch_access_token(app_id, app_secret, base_url)
+        f.seek(0)
+        f.truncate()
+        json.dump({"token": token, "expires_at": expires_at}, f)
+        return token
+
+def _cached_token(cache_key: str) -> Optional[str]:
+    """Returns the cached token if it is still valid (allowing for TOKEN_EXPIRY_BUFFER), else None."""
+    entry = cache.get(cache_key)
+    if entry and time.time() < (entry[1] - TOKEN_EXPIRY_BUFFER):
+        return entry[0]
+    return None
 
 def get_access_token(
     app_id: str,
@@ -26,6 +152,8 @@ def get_access_token(
     ) -> str:
     """
     Retrieves a valid WeChat access token, using a cache if possible.
+    Concurrent callers (threads and worker processes) wait for a single fetch. Tokens are
+    shared through Django's cache when it is Redis/Memcached, otherwise through a locked file.
 
     Args:
         app_id: WeChat AppID.
@@ -43,12 +171,52 @@ def get_access_token(
         logger.error("Missing AppID or AppSecret for fetching access token.")
         raise ValueError("AppID and AppSecret must be provided.")
 
-    current_time = time.time()
+    if fcntl is not None and _use_token_file():
+        with _lock:
+            return _get_access_token_via_file(app_id, app_secret, base_url)
+
+    cache_key = f"{TOKEN_CACHE_KEY_PREFIX}{app_id}"
+    _token_cache_keys.add(cache_key)
 
     # Check cache first
-    if _token_cache["access_token"] and current_time < (_token_cache["expires_at"] - TOKEN_EXPIRY_BUFFER):
+    token = _cached_token(cache_key)
+    if token:
         logger.info("Using cached access token.")
-        return _token_cache["access_token"]
+        return token
+
+    with _lock:
+        # Another thread may have fetched it while we waited
+        token = _cached_token(cache_key)
+        if token:
+            logger.info("Using access token fetched by another thread.")
+            return token
+
+        # With Redis/Memcached (see _use_token_file) cache.add is atomic, so only one process
+        # holds the lock and the others wait for its token. Without fcntl this path also runs
+        # on other backends, where the lock is best-effort (FileBasedCache.add isn't atomic).
+        lock_key = f"{cache_key}_lock"
+        deadline = time.time() + TOKEN_LOCK_TIMEOUT
+        while not (locked := cache.add(lock_key, os.getpid(), timeout=TOKEN_LOCK_TIMEOUT)):
+            if time.time() >= deadline:
+                logger.warning("Timed out waiting for another process to fetch the access token; fetching it here.")
+                break
+            time.sleep(TOKEN_LOCK_POLL_INTERVAL)
+            token = _cached_token(cache_key)
+            if token:
+                logger.info("Using access token fetched by another process.")
+                return token
+        try:
+            token, expires_at = _fetch_access_token(app_id, app_secret, base_url)
+            # The shared entry expires when the token stops being usable
+            cache.set(cache_key, (token, expires_at), timeout=max(1, int(expires_at - time.time() - TOKEN_EXPIRY_BUFFER)))
+            return token
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+def _fetch_access_token(app_id: str, app_secret: str, base_url: str) -> Tuple[str, float]:
+    """Fetches a new token from WeChat; returns (token, expires_at unix timestamp)."""
+    current_time = time.time()
 
     # --- Token is missing or expired, fetch a new one ---
     logger.info("Fetching new access token from WeChat API...")
@@ -60,7 +228,7 @@ def get_access_token(
     }
 
     try:
-        response = requests.get(token_url, params=params, timeout=10) # Added timeout
+        response = _SESSION.get(token_url, params=params, timeout=10) # Added timeout
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
         data = response.json()
 
@@ -69,23 +237,19 @@ def get_access_token(
             expires_in = data["expires_in"] # Usually 7200 seconds
             expiry_time = current_time + expires_in
 
-            # Update cache
-            _token_cache["access_token"] = new_token
-            _token_cache["expires_at"] = expiry_time
-
-            logger.info(f"Successfully fetched new access token, expires in {expires_in} seconds.")
-            return new_token
+            logger.info("Successfully fetched new access token, expires in %s seconds.", expires_in)
+            return new_token, expiry_time
         else:
             # Handle WeChat API error structure (e.g., errcode, errmsg)
             errcode = data.get('errcode', -1)
             errmsg = data.get('errmsg', 'Unknown error')
-            logger.error(f"WeChat API error while fetching token: {errcode} - {errmsg}")
+            logger.error("WeChat API error while fetching token: %s - %s", errcode, errmsg)
             raise RuntimeError(f"Failed to retrieve access token from WeChat: {errmsg}")
 
     except requests.exceptions.RequestException as e:
-        logger.error(f"Network error while fetching access token: {e}", exc_info=True)
+        logger.error("Network error while fetching access token: %s", e, exc_info=True)
         raise RuntimeError(f"Network error connecting to WeChat API: {e}") from e
     except Exception as e:
-        logger.error(f"Unexpected error fetching access token: {e}", exc_info=True)
+        logger.error("Unexpected error fetching access token: %s", e, exc_info=True)
         # Re-raise original or wrap in RuntimeError
         raise RuntimeError(f"Unexpected error fetching access token: {e}") from e
\ No newline at end of file
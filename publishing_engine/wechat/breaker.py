@@ -0,0 +1,80 @@
+# publishing_engine/wechat/breaker.py
+"""
+Circuit breaker for WeChat API calls, so an outage fails publishes fast instead of
+tying up every worker for a full request timeout.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+from .exceptions import WeChatCircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold failures (5xx responses or network
+    errors) within failure_window seconds; calls then fail fast for open_seconds.
+    After that the circuit is half-open: one probe call is let through, and its
+    outcome closes or re-opens it.
+
+    State lives in Django's cache so all worker processes share it; the failure count
+    needs an atomic, shared add()/incr() (Redis via CACHE_REDIS_URL, or Memcached).
+    On the FileBasedCache concurrent failures can be undercounted, so the circuit
+    opens late; on LocMemCache each process has its own breaker. Successes only reset
+    the count in a process that has seen failures itself (_dirty), so the count is
+    failures across processes within failure_window, not strictly consecutive ones.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, failure_window: int = 60, open_seconds: int = 30, probe_timeout: int = 90):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout # Longest a probe call may take before another is allowed
+        self._failures_key = f"wechat_breaker_{name}_failures"
+        self._open_until_key = f"wechat_breaker_{name}_open_until"
+        self._probe_key = f"wechat_breaker_{name}_probe"
+        # Set when this process has seen failures or an open circuit, so successes
+        # only pay for a cache write when there is state to reset
+        self._dirty = True
+
+    def before_call(self) -> None:
+        """Raises WeChatCircuitOpenError if the call must not be sent."""
+        open_until = cache.get(self._open_until_key)
+        if open_until is None:
+            return
+        self._dirty = True
+        if time.time() < open_until:
+            raise WeChatCircuitOpenError("WeChat API circuit open; not sending request.")
+        # Half-open: only the caller that wins the probe slot goes through
+        if not cache.add(self._probe_key, 1, timeout=self.probe_timeout):
+            raise WeChatCircuitOpenError("WeChat API circuit half-open; probe already in flight.")
+        logger.info("WeChat API circuit half-open; sending probe request.")
+
+    def record_success(self) -> None:
+        """Closes the circuit and clears the failure count."""
+        if self._dirty:
+            if cache.get(self._open_until_key) is not None:
+                logger.info("WeChat API circuit closed after successful probe.")
+            cache.delete_many([self._failures_key, self._open_until_key, self._probe_key])
+            self._dirty = False
+
+    def record_failure(self) -> None:
+        """Counts a failure; opens (or re-opens, after a failed probe) the circuit when due."""
+        self._dirty = True
+        if cache.add(self._failures_key, 1, timeout=self.failure_window):
+            failures = 1
+        else:
+            try:
+                failures = cache.incr(self._failures_key)
+            except ValueError: # Expired between add() and incr()
+                cache.add(self._failures_key, 1, timeout=self.failure_window)
+                failures = 1
+        probing = cache.get(self._probe_key) is not None
+        if failures >= self.failure_threshold or probing:
+            logger.warning("WeChat API circuit open for %ss after %d failures.", self.open_seconds, failures)
+            # Kept well past open_seconds so the half-open probe still finds it
+            cache.set(self._open_until_key, time.time() + self.open_seconds, timeout=self.open_seconds * 10)
+            cache.delete_many([self._failures_key, self._probe_key])
@@ -0,0 +1,27 @@
+"""
+exceptions.py
+
+Exceptions raised by the WeChat API helpers.
+"""
+# publishing_engine/wechat/exceptions.py
+from typing import Optional
+
+
+class WeChatAPIError(RuntimeError):
+    """
+    WeChat answered with a non-zero errcode. Subclasses RuntimeError, so existing
+    `except RuntimeError` handlers keep working; errcode lets callers tell
+    transient failures (system busy, rate limited) from permanent ones.
+    """
+
+    def __init__(self, message: str, errcode: Optional[int] = None, errmsg: Optional[str] = None):
+        super().__init__(message)
+        self.errcode = errcode
+        self.errmsg = errmsg
+
+
+class WeChatCircuitOpenError(RuntimeError):
+    """
+    Raised without contacting WeChat while the circuit breaker is open, i.e. after
+    repeated server errors or timeouts (see breaker.CircuitBreaker).
+    """
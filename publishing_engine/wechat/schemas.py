@@ -2,13 +2,18 @@
 schemas.py
 
 Pydantic models for validating WeChat API responses. Optional but recommended.
+Validate raw bodies with e.g. UploadImageResponse.model_validate_json(response.content),
+which parses in pydantic-core without building an intermediate dict.
 """
 # publishing_engine/wechat/schemas.py
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List
 
 class BaseResponse(BaseModel):
     """Base model for checking WeChat API errors."""
+    # Responses are read-only; fields WeChat adds later are dropped rather than stored
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     errcode: int = 0
     errmsg: str = "ok"
 
@@ -16,14 +21,24 @@ class AccessTokenResponse(BaseResponse):
     access_token: Optional[str] = None
     expires_in: Optional[int] = None
 
+def _check_http_url(url: Optional[str]) -> Optional[str]:
+    """Cheap sanity check; the URL is passed on to WeChat as-is, so it isn't fully parsed."""
+    if url is not None and not url.startswith(('http://', 'https://')):
+        raise ValueError("URL must start with http:// or https://")
+    return url
+
 class UploadImageResponse(BaseResponse):
     """Response for media/uploadimg API."""
-    url: Optional[HttpUrl] = None # Pydantic will validate if it's a URL
+    url: Optional[str] = None
+
+    _check_url = field_validator('url')(_check_http_url)
 
 class AddMaterialResponse(BaseResponse):
     """Response for material/add_material API."""
     media_id: Optional[str] = None
-    url: Optional[HttpUrl] = None # Only present for image uploads
+    url: Optional[str] = None # Only present for image uploads
+
+    _check_url = field_validator('url')(_check_http_url)
 
 class AddDraftResponse(BaseResponse):
     """Response for draft/add API."""
@@ -10,6 +10,12 @@ Requires celery and a broker (like redis or rabbitmq) to be installed.
 """
 import os
 from celery import Celery
+from kombu.serialization import register
+
+try:
+    import orjson # Optional: faster task/result (de)serialization
+except ImportError:
+    orjson = None
 
 # Set the default Django settings module for the 'celery' program.
 # This must be set before creating the app instance.
@@ -30,6 +36,22 @@ app = Celery('wechat_publisher_web')
 # CELERY_RESULT_SERIALIZER = 'json'
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# With orjson installed, tasks and results are serialized with it unless settings.py
+# chooses serializers; 'json' stays accepted for messages from producers without orjson.
+if orjson is not None:
+    register(
+        'orjson',
+        lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8'),
+        orjson.loads,
+        content_type='application/x-orjson',
+        content_encoding='utf-8',
+    )
+    app.add_defaults({
+        'task_serializer': 'orjson',
+        'result_serializer': 'orjson',
+        'accept_content': ['orjson', 'json'],
+    })
+
 # Load task modules from all registered Django app configs.
 # This finds tasks defined in files like 'publisher/tasks.py'.
 app.autodiscover_tasks()
@@ -0,0 +1,87 @@
+# wechat_publisher_web/log_handlers.py
+"""
+Logging handlers referenced from settings.LOGGING.
+"""
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import weakref
+
+# Live handlers, so forked children (e.g. Celery prefork) can restart their listeners
+_handlers: "weakref.WeakSet[QueuedRotatingFileHandler]" = weakref.WeakSet()
+
+
+class _RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Creates the log directory when the file is opened, instead of at settings import."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class QueuedRotatingFileHandler(logging.Handler):
+    """
+    A RotatingFileHandler behind a queue: the logging thread only formats the record
+    and enqueues it, while a QueueListener thread does the (locked, synchronous)
+    file writes and rollovers. Takes the same arguments as RotatingFileHandler.
+
+    Level and formatter configured on this handler apply before the record is queued.
+    This is a plain Handler owning its queue and listener, not a QueueHandler subclass:
+    on Python 3.12+ dictConfig requires 'queue'/'handlers' keys for any QueueHandler.
+    """
+
+    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None, delay=False):
+        super().__init__()
+        self.queue = queue.SimpleQueue()
+        self.target = _RotatingFileHandler(
+            filename, mode=mode, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=delay
+        )
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+        _handlers.add(self)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Formats the record here (as QueueHandler does) and returns a copy that is safe
+        to hand to another thread: message merged, args and exception info dropped.
+        """
+        msg = self.format(record)
+        record = copy.copy(record)
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def _restart_listener(self) -> None:
+        """The listener thread doesn't survive fork; give the child its own queue and thread."""
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def close(self) -> None:
+        """Drains the queue (stop() waits for the listener) before closing the file."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+
+def _restart_listeners_after_fork() -> None:
+    for handler in list(_handlers):
+        if handler.listener is not None:
+            handler._restart_listener()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners_after_fork)
@@ -1,36 +1,81 @@
 # wechat_publisher_web/settings.py
 
 from pathlib import Path
+import io
 import os
+import select
+import stat
+import time
 from dotenv import load_dotenv
 import logging # Import logging
-import logging.config # Import logging config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# --- Load .env file ---
-dotenv_path = BASE_DIR / '.env'
-load_dotenv(dotenv_path=dotenv_path)
 logger_for_settings = logging.getLogger(__name__) # Logger for messages during settings load
 
-# --- Create cache and log directories if they don't exist ---
+# --- Load .env file ---
+dotenv_path = BASE_DIR / '.env'
+# Seconds to wait for a writer when .env is a FIFO (e.g. a 1Password-mounted .env)
+DOTENV_FIFO_TIMEOUT = 10.0
+
+def _load_dotenv_file(path: Path) -> None:
+    """
+    load_dotenv for a regular file or a FIFO. Plain open()/read() on a FIFO blocks until
+    a writer appears, which would hang startup forever; it is read with a timeout instead.
+    """
+    try:
+        is_fifo = stat.S_ISFIFO(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return
+    if not is_fifo:
+        load_dotenv(dotenv_path=path)
+        return
+
+    chunks = []
+    deadline = time.monotonic() + DOTENV_FIFO_TIMEOUT
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK) # Doesn't wait for a writer
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                logger_for_settings.warning("Timed out reading %s (FIFO) after %ss; using what was read.", path, DOTENV_FIFO_TIMEOUT)
+                break
+            data = os.read(fd, 65536)
+            if not data: # Writer closed its end
+                break
+            chunks.append(data)
+    finally:
+        os.close(fd)
+    load_dotenv(stream=io.StringIO(b''.join(chunks).decode('utf-8')))
+
+# Child processes (runserver's autoreloader, Celery workers) inherit the loaded
+# variables, and load_dotenv never overrides them, so only the first process parses .env
+if not os.environ.get('WECHAT_PUBLISHER_DOTENV_LOADED'):
+    _load_dotenv_file(dotenv_path)
+    os.environ['WECHAT_PUBLISHER_DOTENV_LOADED'] = '1'
+
+# --- Cache and log directories ---
+# Created on first use: FileBasedCache creates its LOCATION on the first write, and the
+# log file handlers create LOG_DIR when they first open their file
 CACHE_DIR = BASE_DIR / 'cache'
 LOG_DIR = BASE_DIR / 'logs' # Define LOG_DIR before using it in LOGGING
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 # Quick-start development settings - unsuitable for production
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-default-key-for-dev')
 # Determine DEBUG status from environment variable
 DEBUG_FLAG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
-ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '127.0.0.1,localhost').split(',')
+# Entries are stripped so 'a.com, b.com' works; empty entries (trailing comma) are dropped
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', '127.0.0.1,localhost').split(',') if host.strip()]
+
+logger_for_settings.info("Django DEBUG mode is set to: %s", DEBUG_FLAG)
 
-logger_for_settings.info(f"Django DEBUG mode is set to: {DEBUG_FLAG}")
+# Set ENABLE_ADMIN=False for processes that don't need the admin site: the admin app,
+# its ModelAdmin autodiscovery and its URLs are then not loaded
+ENABLE_ADMIN = os.getenv('ENABLE_ADMIN', 'True').lower() in ('true', '1', 't')
 
 # Application definition
 INSTALLED_APPS = [
-    "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -40,8 +85,10 @@ INSTALLED_APPS = [
     # Assuming publishing_engine is used by publisher but not a separate Django app
     # If publishing_engine IS a Django app, add it here too.
     "rest_framework",                 # Django REST framework
-    "storages",                       # django-storages app
+    # "storages" (django-storages) is added below, only when GCS is configured
 ]
+if ENABLE_ADMIN:
+    INSTALLED_APPS.insert(0, "django.contrib.admin")
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -116,16 +163,33 @@ WECHAT_DRAFT_PLACEHOLDER_CONTENT = os.getenv(
 )
 # Cache timeout for permanent media (None means cache forever)
 WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT = None
+# Failed content-image uploads are remembered only briefly, so a transient error
+# doesn't block that image on every later publish (seconds)
+WECHAT_UPLOAD_FAILURE_CACHE_TIMEOUT = 600
 
 # --- Django Cache Configuration ---
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': str(CACHE_DIR),
-        'TIMEOUT': WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT, # Use the setting from above
-        'OPTIONS': { 'MAX_ENTRIES': 1000 }
+# Set CACHE_REDIS_URL (e.g. redis://localhost:6379/1; needs the redis package) to keep the
+# cache in Redis: shared by all workers without a file open/read/write per operation,
+# and with the atomic add()/incr() the WeChat circuit breaker's failure count relies on.
+# Otherwise the file-based cache is used, which also persists across restarts.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'TIMEOUT': WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(CACHE_DIR),
+            'TIMEOUT': WECHAT_PERMANENT_MEDIA_CACHE_TIMEOUT, # Use the setting from above
+            'OPTIONS': { 'MAX_ENTRIES': 1000 }
+        }
     }
-}
 
 # --- Google Cloud Storage Settings (Optional - if used) ---
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
@@ -138,8 +202,9 @@ GS_PROJECT_ID = os.getenv('GS_PROJECT_ID')
 
 # Determine the backend based on GS_BUCKET_NAME
 if GS_BUCKET_NAME:
+    INSTALLED_APPS.append("storages") # Not loaded (or required) without GCS
     default_storage_backend = 'storages.backends.gcloud.GoogleCloudStorage'
-    logger_for_settings.info(f"Using GoogleCloudStorage backend for default storage (Bucket: {GS_BUCKET_NAME}).")
+    logger_for_settings.info("Using GoogleCloudStorage backend for default storage (Bucket: %s).", GS_BUCKET_NAME)
 else:
     default_storage_backend = 'django.core.files.storage.FileSystemStorage'
     logger_for_settings.info("Using FileSystemStorage backend for default storage.")
@@ -171,9 +236,16 @@ if STORAGES['default']['BACKEND'] == 'storages.backends.gcloud.GoogleCloudStorag
      logger_for_settings.error("GoogleCloudStorage is set as default storage backend, but GS_BUCKET_NAME is missing!")
 
 # --- Path to the CSS file for HTML previews ---
+# (A missing file is reported when a publish job reads it, not at startup)
 PREVIEW_CSS_FILE_PATH = BASE_DIR / 'publisher/static/publisher/css/style.css'
-if not Path(PREVIEW_CSS_FILE_PATH).is_file():
-     logger_for_settings.warning(f"Preview CSS file not found at: {PREVIEW_CSS_FILE_PATH}")
+
+# --- Markdown rendering engine ---
+# 'python-markdown' (the default, original renderer) or, opt-in, 'mistune' (faster; optional
+# package, not in the lockfile) which renders CommonMark: no attr_list, and different raw-HTML
+# and list handling. 'pyromark' (Rust pulldown-cmark, fastest; optional package) is also
+# CommonMark and renders code blocks without codehilite/pygments markup, so only use it with
+# CSS that doesn't rely on .codehilite.
+MARKDOWN_ENGINE = os.getenv('MARKDOWN_ENGINE', 'python-markdown').lower()
 
 
 # --- Logging Configuration ---
@@ -194,6 +266,8 @@ LOGGING = {
             'datefmt': '%Y-%m-%d %H:%M:%S,%f', # Add milliseconds if needed
         },
     },
+    # The file handlers are RotatingFileHandlers fed through a queue, so logging calls
+    # in request/task threads don't wait on file writes or rollovers
     'handlers': {
         # Handler for console output (for development/debugging)
         'console': {
@@ -205,22 +279,24 @@ LOGGING = {
         # Handler for general Django logs -> logs/django.log
         'django_file': {
             'level': 'INFO', # Log INFO and above for Django core
-            'class': 'logging.handlers.RotatingFileHandler',
+            'class': 'wechat_publisher_web.log_handlers.QueuedRotatingFileHandler', # Written by a background thread
             'filename': LOG_DIR / 'django.log',
             'maxBytes': 1024 * 1024 * 5,  # 5 MB
             'backupCount': 5, # Keep 5 backup files
             'formatter': 'verbose',
             'encoding': 'utf-8', # Explicitly set encoding
+            'delay': True, # Open (and create LOG_DIR) on the first record
         },
         # Handler specifically for publisher app -> logs/publisher.log
         'publisher_file': {
             'level': 'DEBUG', # Capture DEBUG and above from publisher app
-            'class': 'logging.handlers.RotatingFileHandler',
+            'class': 'wechat_publisher_web.log_handlers.QueuedRotatingFileHandler', # Written by a background thread
             'filename': LOG_DIR / 'publisher.log',
             'maxBytes': 1024 * 1024 * 5,  # 5 MB
             'backupCount': 5,
             'formatter': 'verbose', # Use detailed format for file logs
             'encoding': 'utf-8', # Explicitly set encoding
+            'delay': True, # Open (and create LOG_DIR) on the first record
         },
     },
     'loggers': {
@@ -253,8 +329,8 @@ LOGGING = {
     },
 }
 
-# Apply the logging configuration from the dictionary
-logging.config.dictConfig(LOGGING)
+# LOGGING is applied by Django's setup() (LOGGING_CONFIG), not here, so the handlers
+# and their listener threads are only built once per process
 
 # --- Django DEBUG setting ---
 # Controls Django's internal debug features (like error pages)
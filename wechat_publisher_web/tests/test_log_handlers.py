@@ -0,0 +1,55 @@
+# wechat_publisher_web/tests/test_log_handlers.py
+"""
+Tests for the logging handlers used by settings.LOGGING.
+"""
+import copy
+import logging
+import logging.config
+
+import pytest
+from django.conf import settings
+
+from wechat_publisher_web.log_handlers import QueuedRotatingFileHandler
+
+
+@pytest.fixture
+def logging_config(tmp_path):
+    """settings.LOGGING with the file handlers pointed at tmp_path; restores the real config afterwards."""
+    config = copy.deepcopy(settings.LOGGING)
+    for handler in config['handlers'].values():
+        if 'filename' in handler:
+            handler['filename'] = tmp_path / 'logs' / handler['filename'].name
+    yield config
+    logging.config.dictConfig(settings.LOGGING)
+
+
+def test_dict_config_accepts_settings_logging(logging_config, tmp_path):
+    """dictConfig builds the queued file handlers (on 3.12+ it rejects QueueHandler subclasses without 'queue'/'handlers')."""
+    logging.config.dictConfig(logging_config)
+    handlers = logging.getLogger('publisher').handlers
+    file_handler = next(h for h in handlers if isinstance(h, QueuedRotatingFileHandler))
+    assert not (tmp_path / 'logs').exists() # delay: nothing is created before the first record
+
+    logging.getLogger('publisher').info("queued %s", "record")
+    file_handler.close() # Drains the queue
+
+    assert "queued record" in (tmp_path / 'logs' / 'publisher.log').read_text(encoding='utf-8')
+
+
+def test_exception_formatted_before_queueing(tmp_path):
+    handler = QueuedRotatingFileHandler(tmp_path / 'app.log', delay=True)
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logger = logging.getLogger('wechat_publisher_web.tests.queued')
+    logger.addHandler(handler)
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    text = (tmp_path / 'app.log').read_text(encoding='utf-8')
+    assert text.startswith("ERROR failed\nTraceback")
+    assert "ValueError: boom" in text
@@ -2,18 +2,22 @@
 """
 URL configuration for wechat_publisher_web project.
 """
-from django.contrib import admin
 from django.urls import path, include # Make sure include is imported
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     # This includes your publisher app's URLs starting from the root path ""
     path("", include("publisher.urls", namespace="publisher")),
 ]
 
+# The admin site is only mounted (and imported) where it is enabled
+if settings.ENABLE_ADMIN:
+    from django.contrib import admin
+    urlpatterns.insert(0, path("admin/", admin.site.urls))
+
 # This part is for serving static and media files during development
+# (imported here so production processes never load django.views.static)
 if settings.DEBUG:
+    from django.conf.urls.static import static
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
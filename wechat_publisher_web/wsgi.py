@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/stable/howto/deployment/wsgi/
 """
 import os
 from django.core.wsgi import get_wsgi_application
+from django.template.loader import get_template
+from django.urls import get_resolver
 
 # Set the default Django settings module for the 'wsgi' application.
 # Adjust 'wechat_publisher_web.settings' if your settings file is named differently
@@ -18,4 +20,27 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wechat_publisher_web.settings')
 
 # Get the WSGI application instance for the Django project.
-application = get_wsgi_application()
\ No newline at end of file
+django_application = get_wsgi_application()
+
+# Import the URLconfs and compile their patterns now rather than on the first request.
+# uWSGI loads the app in the master (no lazy-apps), so forked workers start warm.
+get_resolver().reverse_dict
+# Likewise build the template engine and compile the upload form into the cached loader.
+get_template('publisher/upload_form.html')
+
+_HEALTHZ_BODY = b"ok"
+_HEALTHZ_HEADERS = [
+    ("Content-Type", "text/plain"),
+    ("Content-Length", str(len(_HEALTHZ_BODY))),
+]
+
+
+def application(environ, start_response):
+    """
+    Answers load-balancer probes on /healthz without entering Django (no middleware,
+    no URL resolution, no DB); everything else goes to the Django application.
+    """
+    if environ.get("PATH_INFO") == "/healthz":
+        start_response("200 OK", list(_HEALTHZ_HEADERS))
+        return [_HEALTHZ_BODY]
+    return django_application(environ, start_response)